@@ -1,6 +1,10 @@
 import os
+from typing import List, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from backend.utils.retrieval import DEFAULT_MIN_SIMILARITY
+
 # Rutas base del proyecto (deben existir FUERA de la clase)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -28,6 +32,32 @@ class Settings(BaseSettings):
     # RAG Engine 
     CHROMA_COLLECTION_NAME: str = "ticket_history_collection"
     KNOWLEDGE_BASE_PATH: str = os.path.join(KNOWLEDGE_DIR, "Knowledge_base.json")
+    RAG_TOP_K: int = 5                               # Documentos recuperados por consulta
+    RAG_MIN_SIMILARITY: float = DEFAULT_MIN_SIMILARITY  # Similitud coseno mínima de la evidencia
+    RAG_RULES_ONLY_ON_LOW_RELEVANCE: bool = False    # Sin evidencia relevante → clasificar solo con reglas (sin LLM)
+
+    # Snapshot del índice a importar al arrancar (sin llamadas de embeddings).
+    # Se versiona el snapshot coseno, no el directorio de Chroma
+    INDEX_SNAPSHOT_PATH: Optional[str] = os.path.join(DATA_DIR, "snapshots", "default.json.gz")
+
+    # Tenants a calentar antes de marcar la réplica como lista (además del por defecto)
+    WARMUP_TENANTS: List[str] = []
+
+    # Multi-tenant (colección y Knowledge Base por tenant)
+    DEFAULT_TENANT_ID: str = "default"
+    TENANTS_CONFIG_PATH: str = os.path.join(KNOWLEDGE_DIR, "tenants.json")
+    TENANT_MEMORY_BUDGET_MB: int = 512
+    TENANT_MAX_LOADED: int = 8
+
+    # Registro de clientes (impacto de negocio, recarga en caliente)
+    CLIENT_REGISTRY_PATH: str = os.path.join(KNOWLEDGE_DIR, "clients.json")
+    CLIENT_REGISTRY_RELOAD_SECONDS: float = 5.0
+
+    # Jobs asíncronos (POST /jobs)
+    JOBS_DB_PATH: str = os.path.join(DATA_DIR, "jobs.sqlite3")
+    JOB_WORKERS: int = 2
+    JOB_RESULT_TTL_SECONDS: int = 3600
+    JOB_LEASE_SECONDS: int = 300                     # Un job 'running' sin heartbeat por este tiempo se recupera
 
     # Configuración del servidor API 
     API_HOST: str = "127.0.0.1"
@@ -0,0 +1,468 @@
+"""
+Harness de evaluación de recuperación RAG sobre la Knowledge Base.
+
+Cada ticket histórico se usa como consulta (leave-one-out) contra el resto
+de la base. Se mide, por combinación de embedder / backend / plantilla / k:
+- recall@k y MRR@10 (relevantes = tickets del mismo dominio de categoría,
+  p. ej. 'Seguridad' en 'Seguridad – Autenticación'; las categorías completas son casi únicas)
+- exactitud de dominio de categoría y de prioridad por voto ponderado del top-k
+- latencia de recuperación por consulta (embedding + búsqueda)
+- tasa de consultas sin evidencia sobre el umbral de similitud (salida temprana)
+
+Corre sin red con el embedder local 'hashing' o con 'openai-cache'
+(embeddings de OpenAI cacheados en disco).
+
+Uso:
+    python -m backend.evaluation.retrieval_eval --embedder hashing --backend memory -k 3 5
+    python -m backend.evaluation.retrieval_eval --output report.json --baseline old_report.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+from backend.utils.retrieval import (
+    DEFAULT_DOMAIN_HINT,
+    DEFAULT_MIN_SIMILARITY,
+    DISTANCE_SPACE,
+    build_document_text,
+    build_search_query,
+    distance_to_score,
+)
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_KB_PATH = os.path.join(BASE_DIR, "data", "knowledge", "Knowledge_base.json")
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "data", "embeddings_cache.json")
+
+# Afectación representativa por prioridad (la KB no guarda el porcentaje)
+AFFECTED_BY_PRIORITY: Dict[str, int] = {"P1": 100, "P2": 65, "P3": 35, "P4": 10}
+
+# Corte fijo del MRR: no depende de los -k pedidos, así los reportes son comparables
+MRR_CUTOFF = 10
+
+# Plantillas de consulta a comparar
+QUERY_TEMPLATES: Dict[str, str] = {
+    "default": DEFAULT_DOMAIN_HINT,
+    "sin_dominio": "",
+}
+
+
+# Embedders
+class HashingEmbedder:
+    """Embedder local determinístico (unigramas + bigramas con hashing). No usa red."""
+
+    def __init__(self, dims: int = 512):
+        self.dims = dims
+        self.id = f"hashing-{dims}"
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+        words = re.findall(r"[0-9a-z]+", text)
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dims
+        for token in self._tokens(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dims
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+
+class CachedOpenAIEmbedder:
+    """
+    Embeddings de OpenAI cacheados en disco por hash del texto.
+    Con la caché completa corre sin red; si falta un texto se llama a la API
+    (requiere OPENAI_API_KEY) y se guarda.
+    """
+
+    def __init__(self, model: str = "text-embedding-3-small", cache_path: str = DEFAULT_CACHE_PATH):
+        self.model = model
+        self.id = f"openai:{model}"
+        self.cache_path = cache_path
+        self._client = None
+        self._dirty = False
+
+        self.cache: Dict[str, List[float]] = {}
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, text: str) -> List[float]:
+        key = self._key(text)
+        if key not in self.cache:
+            if self._client is None:
+                if not os.environ.get("OPENAI_API_KEY"):
+                    raise RuntimeError(
+                        f"Embedding no cacheado en {self.cache_path} y OPENAI_API_KEY no definida."
+                    )
+                from openai import OpenAI
+                self._client = OpenAI()
+
+            resp = self._client.embeddings.create(model=self.model, input=text)
+            self.cache[key] = resp.data[0].embedding
+            self._dirty = True
+
+        return self.cache[key]
+
+    def save(self):
+        if self._dirty:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            self._dirty = False
+
+
+EMBEDDERS: Dict[str, Callable[[], Any]] = {
+    "hashing": HashingEmbedder,
+    "openai-cache": CachedOpenAIEmbedder,
+}
+
+
+# Backends vectoriales
+class MemoryBackend:
+    """Búsqueda exacta en memoria con distancia coseno (igual que Chroma 'cosine')."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.vectors: List[List[float]] = []
+
+    def add(self, ids: List[str], vectors: List[List[float]]):
+        self.ids.extend(ids)
+        self.vectors.extend(vectors)
+
+    def query(self, vector: List[float], k: int, exclude_id: str) -> List[Tuple[str, float]]:
+        query_norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        scored = []
+        for doc_id, doc_vector in zip(self.ids, self.vectors):
+            if doc_id == exclude_id:
+                continue
+            doc_norm = math.sqrt(sum(v * v for v in doc_vector)) or 1.0
+            cosine = sum(a * b for a, b in zip(vector, doc_vector)) / (query_norm * doc_norm)
+            scored.append((doc_id, 1.0 - cosine))
+        scored.sort(key=lambda pair: pair[1])
+        return scored[:k]
+
+
+class ChromaBackend:
+    """Colección Chroma efímera (mismo motor que producción)."""
+
+    name = "chroma"
+
+    def __init__(self):
+        import chromadb
+        client = chromadb.EphemeralClient()
+        collection_name = f"eval_{os.getpid()}_{time.time_ns()}"
+        self.collection = client.get_or_create_collection(
+            name=collection_name,
+            metadata={"hnsw:space": DISTANCE_SPACE},
+        )
+
+    def add(self, ids: List[str], vectors: List[List[float]]):
+        self.collection.add(ids=ids, embeddings=vectors)
+
+    def query(self, vector: List[float], k: int, exclude_id: str) -> List[Tuple[str, float]]:
+        # Se pide uno más para poder excluir la propia consulta (leave-one-out)
+        result = self.collection.query(
+            query_embeddings=[vector],
+            n_results=k + 1,
+            include=["distances"],
+        )
+        pairs = [
+            (doc_id, dist)
+            for doc_id, dist in zip(result["ids"][0], result["distances"][0])
+            if doc_id != exclude_id
+        ]
+        return pairs[:k]
+
+
+BACKENDS: Dict[str, Callable[[], Any]] = {
+    "memory": MemoryBackend,
+    "chroma": ChromaBackend,
+}
+
+
+# Métricas
+def _incident_type(categoria: str) -> str:
+    """'Validación de identidad – Disponibilidad' → 'Disponibilidad' (tipo de incidente)."""
+    return categoria.split("–")[-1].strip()
+
+
+def _category_domain(categoria: str) -> str:
+    """'Validación de identidad – Disponibilidad' → 'Validación de identidad'."""
+    return categoria.split("–")[0].strip()
+
+
+def _weighted_vote(labels: List[str], scores: List[float]) -> str:
+    votes: Dict[str, float] = defaultdict(float)
+    for label, score in zip(labels, scores):
+        votes[label] += score
+    return max(votes, key=votes.get) if votes else ""
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def evaluate(
+    items: List[Dict[str, Any]],
+    embedder: Any,
+    backend_factory: Callable[[], Any],
+    ks: List[int],
+    domain_hint: str,
+    min_similarity: float = DEFAULT_MIN_SIMILARITY,
+) -> Dict[str, Any]:
+    """Evalúa leave-one-out una combinación embedder / backend / plantilla."""
+    by_id = {str(item["ticket_id"]): item for item in items}
+    max_k = max(ks)
+    depth = max(max_k, MRR_CUTOFF)
+
+    backend = backend_factory()
+    backend.add(
+        list(by_id.keys()),
+        [embedder.embed(build_document_text(item)) for item in by_id.values()],
+    )
+
+    latencies_ms: List[float] = []
+    recall: Dict[int, List[float]] = defaultdict(list)
+    reciprocal_ranks: List[float] = []
+    category_hits: Dict[int, int] = defaultdict(int)
+    priority_hits: Dict[int, int] = defaultdict(int)
+    scores_top1: List[float] = []
+    early_exits = 0
+
+    for query_id, item in by_id.items():
+        query = build_search_query(
+            titulo=item["titulo"],
+            descripcion=item["descripcion"],
+            tipo_incidente=_incident_type(item["categoria"]),
+            porcentaje_afectado=AFFECTED_BY_PRIORITY.get(item["prioridad"], 0),
+            domain_hint=domain_hint,
+        )
+
+        start = time.perf_counter()
+        hits = backend.query(embedder.embed(query), depth, exclude_id=query_id)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        relevant = {
+            doc_id for doc_id, other in by_id.items()
+            if doc_id != query_id
+            and _category_domain(other["categoria"]) == _category_domain(item["categoria"])
+        }
+
+        hit_ids = [doc_id for doc_id, _ in hits]
+        scores = [distance_to_score(dist) for _, dist in hits]
+        if scores:
+            scores_top1.append(scores[0])
+
+        # Mismo corte que RAGEngine: sin evidencia sobre el umbral no hay documentos
+        if not scores or scores[0] < min_similarity:
+            early_exits += 1
+
+        rank = next((i + 1 for i, doc_id in enumerate(hit_ids[:MRR_CUTOFF]) if doc_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+        for k in ks:
+            top_ids, top_scores = hit_ids[:k], scores[:k]
+
+            # Sin relevantes en la base la consulta no aporta a recall
+            if relevant:
+                found = len(relevant.intersection(top_ids))
+                recall[k].append(found / min(len(relevant), k))
+
+            predicted_domain = _weighted_vote(
+                [_category_domain(by_id[d]["categoria"]) for d in top_ids], top_scores
+            )
+            predicted_priority = _weighted_vote([by_id[d]["prioridad"] for d in top_ids], top_scores)
+            category_hits[k] += predicted_domain == _category_domain(item["categoria"])
+            priority_hits[k] += predicted_priority == item["prioridad"]
+
+    n = len(by_id)
+    return {
+        "queries": n,
+        "mrr_at_k": {str(MRR_CUTOFF): round(statistics.mean(reciprocal_ranks), 4)},
+        "recall_at_k": {str(k): round(statistics.mean(recall[k]), 4) if recall[k] else 0.0 for k in ks},
+        "category_accuracy_at_k": {str(k): round(category_hits[k] / n, 4) for k in ks},
+        "priority_accuracy_at_k": {str(k): round(priority_hits[k] / n, 4) for k in ks},
+        "mean_top1_score": round(statistics.mean(scores_top1), 4) if scores_top1 else 0.0,
+        "min_similarity": min_similarity,
+        "early_exit_rate": round(early_exits / n, 4),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies_ms), 3),
+            "p50": round(_percentile(latencies_ms, 50), 3),
+            "p95": round(_percentile(latencies_ms, 95), 3),
+            "max": round(max(latencies_ms), 3),
+        },
+    }
+
+
+def run(
+    kb_path: str,
+    embedder_names: List[str],
+    backend_names: List[str],
+    template_names: List[str],
+    ks: List[int],
+    min_similarity: float = DEFAULT_MIN_SIMILARITY,
+) -> Dict[str, Any]:
+    with open(kb_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+
+    report = {
+        "knowledge_base": os.path.basename(kb_path),
+        "ks": ks,
+        "runs": [],
+    }
+
+    for embedder_name in embedder_names:
+        embedder = EMBEDDERS[embedder_name]()
+
+        for backend_name in backend_names:
+            for template_name in template_names:
+                metrics = evaluate(
+                    items=items,
+                    embedder=embedder,
+                    backend_factory=BACKENDS[backend_name],
+                    ks=ks,
+                    domain_hint=QUERY_TEMPLATES[template_name],
+                    min_similarity=min_similarity,
+                )
+                report["runs"].append({
+                    "embedder": embedder.id,
+                    "backend": backend_name,
+                    "template": template_name,
+                    **metrics,
+                })
+
+        if hasattr(embedder, "save"):
+            embedder.save()
+
+    return report
+
+
+# Reporte
+def _run_key(run_data: Dict[str, Any]) -> Tuple[str, str, str]:
+    return run_data["embedder"], run_data["backend"], run_data["template"]
+
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    baseline_runs = {_run_key(r): r for r in (baseline or {}).get("runs", [])}
+
+    for run_data in report["runs"]:
+        print(f"\n=== {run_data['embedder']} | {run_data['backend']} | plantilla '{run_data['template']}' ===")
+        base = baseline_runs.get(_run_key(run_data))
+
+        def fmt(value, base_value):
+            if base_value is None:
+                return f"{value:.4f}"
+            return f"{value:.4f} ({value - base_value:+.4f})"
+
+        for k, value in run_data["mrr_at_k"].items():
+            base_value = base.get("mrr_at_k", {}).get(k) if base else None
+            print(f"MRR@{k}: {fmt(value, base_value)}")
+        for k in report["ks"]:
+            k = str(k)
+            print(
+                f"k={k:>2}  recall={fmt(run_data['recall_at_k'][k], base['recall_at_k'].get(k) if base else None)}  "
+                f"categoría={fmt(run_data['category_accuracy_at_k'][k], base['category_accuracy_at_k'].get(k) if base else None)}  "
+                f"prioridad={fmt(run_data['priority_accuracy_at_k'][k], base['priority_accuracy_at_k'].get(k) if base else None)}"
+            )
+        print(
+            f"Similitud top-1 media: {run_data['mean_top1_score']}  "
+            f"sin evidencia (< {run_data['min_similarity']}): {run_data['early_exit_rate']:.2%}"
+        )
+        latency = run_data["latency_ms"]
+        print(f"Latencia (ms): media={latency['mean']} p50={latency['p50']} p95={latency['p95']} max={latency['max']}")
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Métricas de calidad que cayeron más que la tolerancia respecto al baseline."""
+    baseline_runs = {_run_key(r): r for r in baseline.get("runs", [])}
+    regressions = []
+
+    for run_data in report["runs"]:
+        base = baseline_runs.get(_run_key(run_data))
+        if base is None:
+            continue
+
+        # Solo se comparan métricas con el mismo corte (reportes viejos con 'mrr' sin corte se omiten)
+        checks = []
+        for metric in ("mrr_at_k", "recall_at_k", "category_accuracy_at_k", "priority_accuracy_at_k"):
+            for k, value in run_data[metric].items():
+                if k in base.get(metric, {}):
+                    checks.append((f"{metric}[{k}]", value, base[metric][k]))
+
+        for name, value, base_value in checks:
+            if base_value - value > tolerance:
+                regressions.append(f"{'/'.join(_run_key(run_data))} {name}: {base_value} → {value}")
+
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluación de calidad y latencia de recuperación RAG.")
+    parser.add_argument("--kb", default=DEFAULT_KB_PATH, help="Ruta a la Knowledge Base JSON.")
+    parser.add_argument("--embedder", nargs="+", default=["hashing"], choices=sorted(EMBEDDERS))
+    parser.add_argument("--backend", nargs="+", default=["memory"], choices=sorted(BACKENDS))
+    parser.add_argument("--template", nargs="+", default=sorted(QUERY_TEMPLATES), choices=sorted(QUERY_TEMPLATES))
+    parser.add_argument("-k", nargs="+", type=int, default=[1, 3, 5])
+    parser.add_argument("--min-similarity", type=float, default=DEFAULT_MIN_SIMILARITY,
+                        help="Umbral de similitud coseno para considerar evidencia.")
+    parser.add_argument("--output", help="Guardar el reporte JSON en esta ruta.")
+    parser.add_argument("--baseline", help="Reporte JSON previo contra el cual comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Caída máxima permitida por métrica.")
+    args = parser.parse_args(argv)
+
+    report = run(
+        kb_path=args.kb,
+        embedder_names=args.embedder,
+        backend_names=args.backend,
+        template_names=args.template,
+        ks=sorted(set(args.k)),
+        min_similarity=args.min_similarity,
+    )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReporte guardado en {args.output}")
+
+    if baseline:
+        regressions = find_regressions(report, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESIONES DETECTADAS:")
+            for line in regressions:
+                print(f"- {line}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from backend.config import settings, DATA_DIR
 from backend.models.input_schema import TicketInput
-from backend.models.output_schema import TicketClassification
+from backend.models.output_schema import TicketClassification, JobStatus
 from backend.services.llm_classifier import LLMClassifier
+from backend.services.job_queue import JobQueue, IdempotencyConflictError
+from backend.services.tenant_manager import UnknownTenantError
 
 
 app = FastAPI(
@@ -34,6 +38,51 @@ except Exception as e:
     print(f"ERROR FATAL: No se pudo inicializar LLMClassifier. Detalle: {e}")
     classifier = None
 
+
+def _process_job(payload: dict) -> dict:
+    """Handler de la cola: clasifica el ticket encolado."""
+    if classifier is None:
+        raise Exception("Clasificador no disponible.")
+    result = classifier.classify_ticket(TicketInput.model_validate(payload))
+    return result.model_dump()
+
+
+# Cola durable de jobs asíncronos
+job_queue = JobQueue(
+    db_path=settings.JOBS_DB_PATH,
+    handler=_process_job,
+    num_workers=settings.JOB_WORKERS,
+    result_ttl_seconds=settings.JOB_RESULT_TTL_SECONDS,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+)
+
+
+# La réplica solo se declara lista tras el warmup
+ready = False
+
+
+@app.on_event("startup")
+def warmup_classifier():
+    global ready
+    if classifier is None:
+        return
+
+    try:
+        classifier.warmup()
+        ready = True
+    except Exception as e:
+        print(f"ERROR: Falló el warmup del clasificador. Detalle: {e}")
+
+
+@app.on_event("startup")
+def start_job_workers():
+    job_queue.start()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_queue.stop()
+
 # Endpoints
 @app.get("/health")
 def health_check():
@@ -45,11 +94,56 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def readiness_check():
+    if classifier is None or not ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Servicio no listo: warmup pendiente o fallido."
+        )
+    return {"status": "ready"}
+
+
+def _apply_tenant(ticket_data: TicketInput, x_tenant_id: Optional[str]) -> TicketInput:
+    """El tenant del body tiene precedencia; si no viene, se usa el header X-Tenant-ID."""
+    if ticket_data.tenant_id is None and x_tenant_id:
+        ticket_data.tenant_id = x_tenant_id
+
+    try:
+        classifier.tenant_manager.resolve_tenant(ticket_data.tenant_id)
+    except UnknownTenantError:
+        raise HTTPException(status_code=404, detail=f"Tenant desconocido: {ticket_data.tenant_id}")
+
+    return ticket_data
+
+
+@app.get("/clients", response_model=List[str])
+def list_clients():
+    """Clientes del registro (recarga en caliente) para poblar el dropdown del frontend."""
+    if classifier is None:
+        raise HTTPException(status_code=503, detail="Clasificador no disponible.")
+    return classifier.prompt_manager.client_registry.client_names()
+
+
+@app.get("/tenants/stats")
+def tenant_stats():
+    if classifier is None:
+        raise HTTPException(status_code=503, detail="Clasificador no disponible.")
+    return classifier.tenant_manager.stats()
+
+
+# Endpoint síncrono: FastAPI lo corre en el threadpool, así la carga de un tenant
+# frío (embeddings bloqueantes) no detiene el event loop (/health, /ready, /jobs)
 @app.post("/classify", response_model=TicketClassification)
-async def classify_ticket_endpoint(ticket_data: TicketInput):
+def classify_ticket_endpoint(
+    ticket_data: TicketInput,
+    x_tenant_id: Optional[str] = Header(default=None, alias="X-Tenant-ID"),
+):
     if classifier is None:
         raise HTTPException(status_code=503, detail="Clasificador no disponible.")
 
+    ticket_data = _apply_tenant(ticket_data, x_tenant_id)
+
     try:
         result = classifier.classify_ticket(ticket_data)
         return result
@@ -62,6 +156,39 @@ async def classify_ticket_endpoint(ticket_data: TicketInput):
         )
 
 
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+def submit_job_endpoint(
+    ticket_data: TicketInput,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    x_tenant_id: Optional[str] = Header(default=None, alias="X-Tenant-ID"),
+):
+    if classifier is None:
+        raise HTTPException(status_code=503, detail="Clasificador no disponible.")
+
+    ticket_data = _apply_tenant(ticket_data, x_tenant_id)
+
+    try:
+        job, created = job_queue.submit(ticket_data.model_dump(), idempotency_key=idempotency_key)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    # Envío duplicado: se devuelve el job existente
+    if not created:
+        response.status_code = 200
+
+    response.headers["Location"] = f"/jobs/{job['job_id']}"
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job_endpoint(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado o expirado.")
+    return job
+
+
 # Punto de entrada local
 if __name__ == "__main__":
     uvicorn.run(
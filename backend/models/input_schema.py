@@ -23,6 +23,12 @@ class TicketInput(BaseModel):
         description="Información adicional relevante del ticket (opcional)."
     )
 
+    # Unidad de negocio (colección y Knowledge Base propias). También vía header X-Tenant-ID
+    tenant_id: Optional[str] = Field(
+        default=None,
+        description="Identificador del tenant. Si se omite se usa el tenant por defecto."
+    )
+
     # Validación extra para evitar textos vacíos o absurdos
     @field_validator("titulo", "descripcion")
     def validate_non_empty(cls, v):
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
@@ -52,3 +53,18 @@ class TicketClassification(BaseModel):
         default=None,
         description="Documentos históricos relevantes usados por RAG."
     )
+
+
+class JobStatus(BaseModel):
+    """Estado de una clasificación asíncrona (POST /jobs, GET /jobs/{id})."""
+
+    job_id: str
+    status: str = Field(..., description="pending, running, completed, failed")
+    created_at: datetime
+    updated_at: datetime
+    expires_at: Optional[datetime] = Field(
+        default=None,
+        description="Momento en que el resultado deja de estar disponible."
+    )
+    result: Optional[TicketClassification] = None
+    error: Optional[str] = None
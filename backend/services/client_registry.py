@@ -0,0 +1,127 @@
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+
+def normalize_client_name(name: str) -> str:
+    """'Banco del Mañana ' → 'banco del manana' (sin tildes, mayúsculas ni puntuación)."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^0-9a-z]+", " ", text.casefold())
+    return text.strip()
+
+
+def _build_client_rule(client: Dict[str, Any]) -> Optional[str]:
+    """Regla de boost de un cliente (None si no aplica ningún boost)."""
+    insights = []
+    if client.get("Estado") == "En Riesgo de Churn":
+        insights.append("Puede subir prioridad si es P3/P4")
+    if client.get("Impacto_Critico"):
+        insights.append("Impacto crítico: probabilidad de P1 o P2")
+
+    if not insights:
+        return None
+    return f"- {client['nombre']} (${client['MRR']} MRR): {', '.join(insights)}"
+
+
+class _RegistrySnapshot:
+    """Vista inmutable del registro. Se reemplaza completa en cada recarga."""
+
+    def __init__(self, clients: List[Dict[str, Any]], mtime: float):
+        self.mtime = mtime
+        self.clients: Dict[str, Dict[str, Any]] = {}
+        self.index: Dict[str, str] = {}
+        self.rules: Dict[str, Optional[str]] = {}
+
+        for client in clients:
+            name = client["nombre"]
+            self.clients[name] = client
+            self.rules[name] = _build_client_rule(client)
+
+            # Índice por nombre normalizado y por alias
+            for key in [name, *client.get("aliases", [])]:
+                self.index[normalize_client_name(key)] = name
+
+
+class ClientRegistry:
+    """
+    Registro de impacto de negocio por cliente:
+    - Cargado desde archivo JSON (MRR, estado, impacto crítico, alias)
+    - Índices por nombre normalizado y alias → búsqueda O(1)
+    - Recarga en caliente y atómica cuando cambia el archivo
+    """
+
+    def __init__(self, path: str, reload_interval_seconds: float = 5.0):
+        self.path = path
+        self.reload_interval_seconds = reload_interval_seconds
+
+        self._reload_lock = threading.Lock()
+        self._last_check = 0.0
+        self._snapshot = self._load()
+
+    # Carga
+    def _load(self) -> _RegistrySnapshot:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Registro de clientes no encontrado: {self.path}")
+
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            clients = json.load(f)
+
+        return _RegistrySnapshot(clients, mtime)
+
+    def _maybe_reload(self):
+        """Revisa el mtime del archivo como máximo una vez por intervalo."""
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval_seconds:
+            return
+
+        # Solo un hilo revisa; el resto sigue usando el snapshot actual
+        if not self._reload_lock.acquire(blocking=False):
+            return
+
+        try:
+            self._last_check = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return
+
+            if mtime == self._snapshot.mtime:
+                return
+
+            try:
+                # Reemplazo atómico: los lectores ven el snapshot viejo o el nuevo, nunca uno parcial
+                self._snapshot = self._load()
+                print(f"Registro de clientes recargado: {len(self._snapshot.clients)} clientes.")
+            except Exception as e:
+                print("ERROR: No se pudo recargar el registro de clientes, se mantiene el anterior:", e)
+        finally:
+            self._reload_lock.release()
+
+    # Consultas
+    def resolve_name(self, name: str) -> Optional[str]:
+        """Nombre canónico del cliente (por nombre o alias), o None si no existe."""
+        self._maybe_reload()
+        return self._snapshot.index.get(normalize_client_name(name))
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        self._maybe_reload()
+        snapshot = self._snapshot
+        canonical = snapshot.index.get(normalize_client_name(name))
+        return snapshot.clients.get(canonical) if canonical else None
+
+    def get_rule(self, name: str) -> Optional[str]:
+        """Regla de boost precalculada para el cliente del ticket."""
+        self._maybe_reload()
+        snapshot = self._snapshot
+        canonical = snapshot.index.get(normalize_client_name(name))
+        return snapshot.rules.get(canonical) if canonical else None
+
+    def client_names(self) -> List[str]:
+        self._maybe_reload()
+        return list(self._snapshot.clients.keys())
@@ -0,0 +1,269 @@
+"""
+Snapshots portables del índice RAG.
+
+Un snapshot guarda vectores, documentos, metadatos, el id del embedder y hashes
+de contenido, para que una réplica nueva importe el índice al arrancar sin
+llamar a la API de embeddings.
+
+Uso:
+    python -m backend.services.index_snapshot export --output data/snapshots/default.json.gz
+    python -m backend.services.index_snapshot import --input data/snapshots/default.json.gz
+    python -m backend.services.index_snapshot migrate   # índice L2 → coseno, una sola vez
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+from backend.config import settings
+from backend.utils.retrieval import build_document_metadata, build_document_text, DISTANCE_SPACE
+
+
+# v2: el hash de contenido cubre documento + metadatos
+SNAPSHOT_FORMAT_VERSION = 2
+
+# Tamaño de lote al insertar en Chroma
+IMPORT_BATCH_SIZE = 500
+
+# Archivo de lock dentro del directorio de embeddings
+INDEX_LOCK_FILENAME = ".index.lock"
+
+
+class SnapshotError(Exception):
+    """Snapshot inválido, corrupto o incompatible con la configuración actual."""
+
+
+def content_hash(document: str, metadata: Dict[str, Any]) -> str:
+    """Hash del registro indexado completo: texto embebido y metadatos de evidencia."""
+    record = json.dumps({"document": document, "metadata": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(record.encode("utf-8")).hexdigest()
+
+
+def _items_checksum(items: List[Dict[str, Any]]) -> str:
+    """Checksum de todo el contenido (ids, hashes y vectores) en orden estable."""
+    digest = hashlib.sha256()
+    for item in items:
+        digest.update(item["id"].encode("utf-8"))
+        digest.update(item["content_hash"].encode("utf-8"))
+        digest.update(json.dumps(item["embedding"]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _knowledge_base_hashes(engine) -> Dict[str, str]:
+    """Hash del registro indexable (documento + metadatos) de cada ticket de la Knowledge Base actual."""
+    return {
+        str(item["ticket_id"]): content_hash(build_document_text(item), build_document_metadata(item))
+        for item in engine._load_data()
+    }
+
+
+@contextmanager
+def index_lock(embeddings_dir: str) -> Iterator[None]:
+    """
+    Lock exclusivo entre procesos sobre un store de Chroma. Varios workers de
+    uvicorn arrancan a la vez: solo uno importa / indexa y los demás, al obtener
+    el lock, encuentran la colección lista.
+    """
+    os.makedirs(embeddings_dir, exist_ok=True)
+    with open(os.path.join(embeddings_dir, INDEX_LOCK_FILENAME), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# Exportación
+def export_snapshot(engine, output_path: str) -> Dict[str, Any]:
+    """Exporta la colección del motor a un archivo JSON comprimido."""
+    result = engine.collection.get(include=["documents", "metadatas", "embeddings"])
+
+    items = sorted(
+        (
+            {
+                "id": doc_id,
+                "document": document,
+                "metadata": metadata,
+                "embedding": [float(v) for v in embedding],
+                "content_hash": content_hash(document, metadata),
+            }
+            for doc_id, document, metadata, embedding in zip(
+                result["ids"], result["documents"], result["metadatas"], result["embeddings"]
+            )
+        ),
+        key=lambda item: item["id"],
+    )
+
+    if not items:
+        raise SnapshotError(f"La colección '{engine.collection_name}' está vacía: nada que exportar.")
+
+    snapshot = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": time.time(),
+        "embedder_id": settings.EMBEDDING_MODEL,
+        "distance_space": DISTANCE_SPACE,
+        "collection_name": engine.collection_name,
+        "dimensions": len(items[0]["embedding"]),
+        "count": len(items),
+        "checksum": _items_checksum(items),
+        "items": items,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, output_path)
+
+    print(f"Snapshot exportado: {output_path} ({snapshot['count']} documentos).")
+    return {k: v for k, v in snapshot.items() if k != "items"}
+
+
+# Importación
+def _validate_item_structure(item: Any, position: int):
+    """Cada documento debe traer todas sus llaves con el tipo esperado."""
+    if not isinstance(item, dict):
+        raise SnapshotError(f"Documento #{position} no es un objeto.")
+
+    expected = {"id": str, "document": str, "metadata": dict, "embedding": list, "content_hash": str}
+    for key, expected_type in expected.items():
+        if not isinstance(item.get(key), expected_type):
+            raise SnapshotError(f"Documento #{position}: campo '{key}' ausente o inválido.")
+
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in item["embedding"]):
+        raise SnapshotError(f"Documento #{position}: embedding con valores no numéricos.")
+
+
+def load_snapshot(input_path: str) -> Dict[str, Any]:
+    """Lee y verifica la integridad de un snapshot."""
+    try:
+        with gzip.open(input_path, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError, EOFError) as e:
+        raise SnapshotError(f"No se pudo leer el snapshot {input_path}: {e}")
+
+    if not isinstance(snapshot, dict):
+        raise SnapshotError(f"Formato de snapshot inválido: {input_path}")
+
+    if snapshot.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Versión de snapshot no soportada: {snapshot.get('format_version')}")
+
+    if snapshot.get("embedder_id") != settings.EMBEDDING_MODEL:
+        raise SnapshotError(
+            f"Snapshot generado con '{snapshot.get('embedder_id')}', "
+            f"pero EMBEDDING_MODEL es '{settings.EMBEDDING_MODEL}'."
+        )
+
+    if snapshot.get("distance_space") != DISTANCE_SPACE:
+        raise SnapshotError(f"Espacio de distancia incompatible: {snapshot.get('distance_space')}")
+
+    items = snapshot.get("items")
+    if not isinstance(items, list) or len(items) != snapshot.get("count"):
+        raise SnapshotError("El número de documentos no coincide con el declarado.")
+
+    dimensions = snapshot.get("dimensions")
+    for position, item in enumerate(items):
+        _validate_item_structure(item, position)
+
+        if content_hash(item["document"], item["metadata"]) != item["content_hash"]:
+            raise SnapshotError(f"Hash de contenido inválido para el documento {item['id']}.")
+        if len(item["embedding"]) != dimensions:
+            raise SnapshotError(f"Dimensión inválida para el documento {item['id']}.")
+
+    if _items_checksum(items) != snapshot.get("checksum"):
+        raise SnapshotError("Checksum del snapshot inválido.")
+
+    return snapshot
+
+
+def import_snapshot(engine, input_path: str, force: bool = False) -> bool:
+    """
+    Importa un snapshot en la colección del motor (sin llamadas de embeddings).
+    Retorna False si la colección ya contiene ese mismo snapshot.
+    """
+    snapshot = load_snapshot(input_path)
+
+    # El snapshot debe corresponder a la Knowledge Base actual
+    snapshot_hashes = {item["id"]: item["content_hash"] for item in snapshot["items"]}
+    if snapshot_hashes != _knowledge_base_hashes(engine):
+        raise SnapshotError("El snapshot no corresponde a la Knowledge Base actual. Exporta uno nuevo.")
+
+    current = engine.collection.metadata or {}
+    if not force and current.get("snapshot_checksum") == snapshot["checksum"] \
+            and engine.collection.count() == snapshot["count"]:
+        print(f"Snapshot ya importado en '{engine.collection_name}'. Saltando importación.")
+        return False
+
+    engine.reset_collection(metadata={"snapshot_checksum": snapshot["checksum"]})
+
+    items = snapshot["items"]
+    try:
+        for start in range(0, len(items), IMPORT_BATCH_SIZE):
+            batch = items[start:start + IMPORT_BATCH_SIZE]
+            engine.collection.add(
+                ids=[item["id"] for item in batch],
+                documents=[item["document"] for item in batch],
+                metadatas=[item["metadata"] for item in batch],
+                embeddings=[item["embedding"] for item in batch],
+            )
+    except Exception as e:
+        # Sin importaciones parciales: la colección queda vacía para que index_data la reconstruya
+        engine.reset_collection()
+        raise SnapshotError(f"Falló la importación del snapshot: {e}")
+
+    print(f"Snapshot importado en '{engine.collection_name}': {engine.collection.count()} documentos.")
+    return True
+
+
+def main(argv: List[str] = None) -> int:
+    from backend.services.tenant_manager import TenantManager
+
+    parser = argparse.ArgumentParser(description="Exportar / importar snapshots y migrar el índice RAG.")
+    parser.add_argument("command", choices=["export", "import", "migrate"])
+    parser.add_argument("--tenant", default=None, help="Tenant (por defecto el tenant por defecto).")
+    parser.add_argument("--output", help="Archivo destino (export).")
+    parser.add_argument("--input", help="Archivo origen (import).")
+    parser.add_argument("--force", action="store_true", help="Reimportar aunque ya esté importado.")
+    args = parser.parse_args(argv)
+
+    if args.command == "export" and not args.output:
+        parser.error("export requiere --output")
+    if args.command == "import" and not args.input:
+        parser.error("import requiere --input")
+
+    manager = TenantManager()
+    tenant_id = manager.resolve_tenant(args.tenant)
+
+    # Mismo lock que el arranque de los workers: nunca se recrea la colección con otro proceso importando
+    with index_lock(manager.tenants[tenant_id]["embeddings_dir"]):
+        engine = manager.build_engine(tenant_id)
+        try:
+            if args.command == "export":
+                engine.index_data()
+                export_snapshot(engine, args.output)
+            elif args.command == "import":
+                import_snapshot(engine, args.input, force=args.force)
+            elif not engine.migrate_distance_space():
+                print(f"Colección '{engine.collection_name}' ya está en espacio {DISTANCE_SPACE}.")
+        except SnapshotError as e:
+            print(f"ERROR: {e}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# Estados posibles de un job
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class IdempotencyConflictError(ValueError):
+    """La llave de idempotencia ya se usó con un payload distinto."""
+
+
+def payload_hash(payload: Dict[str, Any]) -> str:
+    """Hash canónico del payload (independiente del orden de las llaves)."""
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+class JobQueue:
+    """
+    Cola durable de clasificaciones asíncronas:
+    - Persistencia local en SQLite (sobrevive reinicios del proceso)
+    - Pool de workers en el mismo proceso; varios procesos pueden compartir la base
+      (reclamo atómico + lease con heartbeat)
+    - Llaves de idempotencia para colapsar envíos duplicados
+    - Resultados con TTL
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+        num_workers: int = 2,
+        result_ttl_seconds: int = 3600,
+        poll_interval_seconds: float = 1.0,
+        lease_seconds: float = 300.0,
+    ):
+        self.db_path = db_path
+        self.handler = handler
+        self.num_workers = max(1, num_workers)
+        self.result_ttl_seconds = result_ttl_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.lease_seconds = lease_seconds
+
+        # Una conexión por proceso protegida por lock; entre procesos coordina SQLite
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._workers: List[threading.Thread] = []
+
+        self._create_schema()
+
+    # Esquema
+    def _create_schema(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    idempotency_key TEXT UNIQUE,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    payload_hash TEXT,
+                    claim_token TEXT,
+                    lease_expires_at REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)"
+            )
+
+            # Bases creadas antes de agregar columnas nuevas
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (
+                ("payload_hash", "TEXT"),
+                ("claim_token", "TEXT"),
+                ("lease_expires_at", "REAL"),
+            ):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Transacción de escritura (BEGIN IMMEDIATE): toma el lock de escritura de SQLite
+        antes de leer, así lectura + escritura son atómicas también entre procesos.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+
+    # Ciclo de vida
+    def start(self):
+        """
+        Lanza el pool de workers. Los jobs 'running' de un proceso caído se
+        recuperan solos cuando vence su lease (ver _claim_next).
+        """
+        self._stop.clear()
+        for i in range(self.num_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"job-worker-{i}",
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    # API pública
+    def submit(self, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Encola un job. Retorna (job, encolado).
+        Si la llave de idempotencia ya existe y no ha expirado:
+        - con otro payload → IdempotencyConflictError
+        - job fallido → se reencola (reintento del cliente)
+        - en otro caso → se retorna el job existente sin encolar
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        digest = payload_hash(payload)
+
+        with self._transaction():
+            self._purge_expired(now)
+
+            if idempotency_key:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE idempotency_key = ?",
+                    (idempotency_key,),
+                ).fetchone()
+                if row is not None:
+                    if row["payload_hash"] != digest:
+                        raise IdempotencyConflictError(
+                            f"La llave de idempotencia '{idempotency_key}' ya se usó con otro ticket."
+                        )
+
+                    if row["status"] != JOB_FAILED:
+                        return self._row_to_dict(row), False
+
+                    self._conn.execute(
+                        """
+                        UPDATE jobs
+                        SET status = ?, result = NULL, error = NULL, expires_at = NULL,
+                            claim_token = NULL, lease_expires_at = NULL, updated_at = ?
+                        WHERE job_id = ?
+                        """,
+                        (JOB_PENDING, now, row["job_id"]),
+                    )
+                    job_id = row["job_id"]
+                else:
+                    self._insert(job_id, idempotency_key, payload, digest, now)
+            else:
+                self._insert(job_id, idempotency_key, payload, digest, now)
+
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+        self._wakeup.set()
+        return self._row_to_dict(row), True
+
+    def _insert(self, job_id: str, idempotency_key: Optional[str], payload: Dict[str, Any], digest: str, now: float):
+        self._conn.execute(
+            """
+            INSERT INTO jobs (job_id, idempotency_key, status, payload, payload_hash, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (job_id, idempotency_key, JOB_PENDING, json.dumps(payload), digest, now, now),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._transaction():
+            self._purge_expired(time.time())
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+        return self._row_to_dict(row) if row is not None else None
+
+    # Workers
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """
+        Toma atómicamente (un solo UPDATE … RETURNING) el job más antiguo que esté
+        pendiente o cuyo lease venció (worker caído en cualquier proceso).
+        """
+        now = time.time()
+        claim_token = uuid.uuid4().hex
+
+        with self._lock:
+            return self._conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, claim_token = ?, lease_expires_at = ?, updated_at = ?
+                WHERE job_id = (
+                    SELECT job_id FROM jobs
+                    WHERE status = ? OR (status = ? AND lease_expires_at < ?)
+                    ORDER BY created_at
+                    LIMIT 1
+                )
+                AND (status = ? OR (status = ? AND lease_expires_at < ?))
+                RETURNING *
+                """,
+                (
+                    JOB_RUNNING, claim_token, now + self.lease_seconds, now,
+                    JOB_PENDING, JOB_RUNNING, now,
+                    JOB_PENDING, JOB_RUNNING, now,
+                ),
+            ).fetchone()
+
+    def _renew_lease(self, job_id: str, claim_token: str) -> bool:
+        """Heartbeat: extiende el lease mientras el job siga siendo nuestro."""
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET lease_expires_at = ?
+                WHERE job_id = ? AND claim_token = ? AND status = ?
+                """,
+                (time.time() + self.lease_seconds, job_id, claim_token, JOB_RUNNING),
+            )
+            return cursor.rowcount == 1
+
+    def _heartbeat(self, job_id: str, claim_token: str, done: threading.Event):
+        while not done.wait(timeout=self.lease_seconds / 3):
+            try:
+                if not self._renew_lease(job_id, claim_token):
+                    return
+            except sqlite3.Error as e:
+                # Error transitorio (p. ej. base bloqueada): se reintenta en el próximo latido
+                print(f"Error renovando lease del job {job_id}: {e}")
+
+    def _finish(self, job_id: str, claim_token: str, status: str,
+                result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """Guarda el resultado solo si el job sigue reclamado por este worker."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, result = ?, error = ?, updated_at = ?, expires_at = ?,
+                    lease_expires_at = NULL
+                WHERE job_id = ? AND claim_token = ? AND status = ?
+                """,
+                (
+                    status,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    now,
+                    now + self.result_ttl_seconds,
+                    job_id,
+                    claim_token,
+                    JOB_RUNNING,
+                ),
+            )
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._run_next()
+            except Exception as e:
+                # Un error de SQLite no debe matar al worker: se registra y se reintenta
+                print(f"Error en worker de jobs: {e}")
+                self._stop.wait(timeout=self.poll_interval_seconds)
+
+    def _run_next(self):
+        row = self._claim_next()
+
+        if row is None:
+            # Sin trabajo: esperar un submit o el intervalo de sondeo
+            self._wakeup.wait(timeout=self.poll_interval_seconds)
+            self._wakeup.clear()
+            return
+
+        job_id, claim_token = row["job_id"], row["claim_token"]
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat,
+            args=(job_id, claim_token, done),
+            daemon=True,
+        )
+        heartbeat.start()
+
+        try:
+            try:
+                result = self.handler(json.loads(row["payload"]))
+            except Exception as e:
+                print(f"Error procesando job {job_id}: {e}")
+                self._finish(job_id, claim_token, JOB_FAILED, error=str(e))
+            else:
+                self._finish(job_id, claim_token, JOB_COMPLETED, result=result)
+        finally:
+            done.set()
+
+    # Utilidades
+    def _purge_expired(self, now: float):
+        """Elimina resultados cuyo TTL ya venció (requiere el lock tomado)."""
+        self._conn.execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (now,),
+        )
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["job_id"],
+            "status": row["status"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "expires_at": row["expires_at"],
+        }
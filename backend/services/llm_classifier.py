@@ -1,4 +1,5 @@
 import json
+import time
 from typing import List
 
 from openai import OpenAI
@@ -6,19 +7,29 @@ from openai import OpenAI
 from backend.config import settings
 from backend.models.input_schema import TicketInput
 from backend.models.output_schema import TicketClassification, RAGDocument
-from backend.services.rag_engine import RAGEngine
+from backend.services.tenant_manager import TenantManager
+from backend.services.rag_engine import RetrievalError
 from backend.services.prompt_manager import PromptManager
+from backend.utils.retrieval import build_search_query
+from backend.services.output_validator import (
+    SLA_BY_PRIORITY,
+    URGENCY_BY_PRIORITY,
+    parse_model_output,
+    priority_from_affected,
+    repair_classification,
+    validate_classification,
+)
 
 
 class LLMClassifier:
     """
     Orquesta el flujo completo:
-    RAG → Prompt → OpenAI LLM → Validación → Respuesta final
+    RAG → Prompt → OpenAI LLM → Validación/Reparación → Respuesta final
     """
 
     def __init__(self):
-        # Inicializar motores dependientes
-        self.rag_engine = RAGEngine()
+        # Inicializar motores dependientes (un motor RAG por tenant, carga perezosa)
+        self.tenant_manager = TenantManager()
         self.prompt_manager = PromptManager()
 
         # Inicializar cliente OpenAI
@@ -30,9 +41,40 @@ class LLMClassifier:
         # Cargar configuración del modelo
         self.llm_model = settings.LLM_MODEL
 
-        # Asegurar que ChromaDB está indexado
-        self.rag_engine.index_data()
+        # Esquema JSON del output (se calcula una sola vez)
+        self.schema_dict = TicketClassification.model_json_schema()
+        self.output_schema_json = json.dumps(self.schema_dict, indent=2)
 
+        # Asegurar que el tenant por defecto está indexado; el resto se carga bajo demanda
+        self.tenant_manager.get_engine(None)
+
+
+    def warmup(self):
+        """
+        Calienta la réplica antes de aceptar tráfico, sin llamadas de embeddings ni LLM:
+        índices HNSW en memoria, registro de clientes y armado de prompt.
+        """
+        start = time.perf_counter()
+
+        for tenant_id in [None, *settings.WARMUP_TENANTS]:
+            with self.tenant_manager.use_engine(tenant_id) as rag_engine:
+                rag_engine.warmup(k=settings.RAG_TOP_K)
+
+        sample_ticket = TicketInput(
+            titulo="Warmup",
+            descripcion="Ticket sintético de warmup.",
+            cliente_afectado="Warmup",
+            porcentaje_afectado=0,
+            tipo_incidente="Consulta",
+        )
+        self.prompt_manager.generate_prompt(
+            ticket_input=sample_ticket,
+            rag_results=[],
+            output_schema_json=self.output_schema_json,
+        )
+        self._classify_rules_only(sample_ticket)
+
+        print(f"Warmup completado en {(time.perf_counter() - start) * 1000:.0f} ms.")
 
     def classify_ticket(self, ticket_input: TicketInput) -> TicketClassification:
         """
@@ -40,53 +82,148 @@ class LLMClassifier:
         """
 
         # 1 — Buscar RAG con query más completa
-        search_query = (
-            f"Título: {ticket_input.titulo}. "
-            f"Descripción: {ticket_input.descripcion}. "
-            f"Tipo de incidente: {ticket_input.tipo_incidente}. "
-            f"Afectación: {ticket_input.porcentaje_afectado}%. "
-            "Dominio técnico esperado: verificación de antecedentes, AML, módulo de antecedentes, performance, latencia, tiempo de respuesta."
+        search_query = build_search_query(
+            titulo=ticket_input.titulo,
+            descripcion=ticket_input.descripcion,
+            tipo_incidente=ticket_input.tipo_incidente,
+            porcentaje_afectado=ticket_input.porcentaje_afectado,
         )
 
-
-        rag_results: List[RAGDocument] = self.rag_engine.retrieve_documents(
-            query_text=search_query,
-            k=5  # mejor recall
+        retrieval_failed = False
+        with self.tenant_manager.use_engine(ticket_input.tenant_id) as rag_engine:
+            retrieval_start = time.perf_counter()
+            try:
+                rag_results: List[RAGDocument] = rag_engine.retrieve_documents(
+                    query_text=search_query,
+                    k=settings.RAG_TOP_K,
+                    raise_on_error=True,
+                )
+            except RetrievalError as e:
+                # Falla de recuperación ≠ sin evidencia: se sigue con el LLM (sin documentos),
+                # que reporta el error si la API tampoco responde
+                print(f"ERROR: Recuperación RAG fallida, se clasifica sin evidencia: {e}")
+                rag_results, retrieval_failed = [], True
+            retrieval_seconds = time.perf_counter() - retrieval_start
+
+        self.tenant_manager.record_retrieval(ticket_input.tenant_id, retrieval_seconds)
+
+        # Sin evidencia relevante: ruta barata solo con reglas (si está habilitada)
+        if not rag_results and not retrieval_failed and settings.RAG_RULES_ONLY_ON_LOW_RELEVANCE:
+            return self._classify_rules_only(ticket_input)
+
+        # 2 — Construir prompt
+        system_prompt = self.prompt_manager.generate_prompt(
+            ticket_input=ticket_input,
+            rag_results=rag_results,
+            output_schema_json=self.output_schema_json
         )
 
-        # 2 — Obtener esquema JSON del output
-        schema_dict = TicketClassification.model_json_schema()
-        output_schema_json = json.dumps(schema_dict, indent=2)
+        # 3 — Llamar al modelo OpenAI
+        try:
+            json_response = self._complete_json(system_prompt)
+        except Exception as e:
+            raise Exception(f"Error en la clasificación LLM: {e}")
 
-        # 3 — Construir prompt
-        system_prompt = self.prompt_manager.generate_prompt(
+        # 4 — Validación con reparación local y re-consulta parcial
+        classification_result = self._validate_with_repair(
             ticket_input=ticket_input,
             rag_results=rag_results,
-            output_schema_json=output_schema_json
+            json_response=json_response,
         )
 
-        # 4 — Llamar al modelo OpenAI
-        try:
-            response = self.client.chat.completions.create(
-                model=self.llm_model,
-                messages=[
-                    {"role": "system", "content": system_prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
+        # 5 — Agregar RAG al resultado
+        classification_result.documentos_rag_usados = rag_results
 
-            json_response = response.choices[0].message.content
+        return classification_result
 
-            # 5 — Validación estricta con Pydantic
-            try:
-                classification_result = TicketClassification.model_validate_json(json_response)
-            except Exception as e:
-                raise Exception(f"JSON inválido recibido del modelo: {json_response}")
+    def _classify_rules_only(self, ticket_input: TicketInput) -> TicketClassification:
+        """
+        Clasificación determinística sin LLM: prioridad por porcentaje de afectación
+        y SLA de la matriz ANS. Se usa cuando el RAG no encontró evidencia relevante.
+        """
+        priority = priority_from_affected(ticket_input.porcentaje_afectado)
+        sla = SLA_BY_PRIORITY[priority]
+
+        return TicketClassification(
+            prioridad=priority,
+            urgencia=URGENCY_BY_PRIORITY[priority],
+            sla_objetivo=sla,
+            categoria_sugerida=ticket_input.tipo_incidente,
+            # Sin históricos relevantes el SLA es la única referencia de tiempo
+            tiempo_estimado_resolucion=sla,
+            nivel_confianza=50.0,
+            justificacion_modelo=(
+                f"Clasificación por reglas: afectación de {ticket_input.porcentaje_afectado}% → {priority}. "
+                "No se encontraron tickets históricos relevantes."
+            ),
+            documentos_rag_usados=[],
+        )
+
+    def _complete_json(self, prompt: str) -> str:
+        """Llamada al modelo forzando salida JSON."""
+        response = self.client.chat.completions.create(
+            model=self.llm_model,
+            messages=[
+                {"role": "system", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        return response.choices[0].message.content
+
+    def _validate_with_repair(
+        self,
+        ticket_input: TicketInput,
+        rag_results: List[RAGDocument],
+        json_response: str,
+    ) -> TicketClassification:
+        """
+        Valida la salida del modelo:
+        1. Reparación determinística local (rango de confianza, SLA por prioridad, llaves extra)
+        2. Si aún faltan campos, una llamada corta que pide SOLO esos campos
+           reutilizando la evidencia RAG ya recuperada
+        """
+
+        data = repair_classification(
+            parse_model_output(json_response),
+            ticket_input.porcentaje_afectado,
+        )
+        classification, invalid_fields = validate_classification(data)
+        if classification is not None:
+            return classification
 
-            # 6 — Agregar RAG al resultado
-            classification_result.documentos_rag_usados = rag_results
+        if not invalid_fields:
+            raise Exception(f"JSON inválido recibido del modelo: {json_response}")
 
-            return classification_result
+        # Descartar valores inválidos y pedir solo lo que falta
+        for field in invalid_fields:
+            data.pop(field, None)
 
+        fields_schema = {
+            field: self.schema_dict["properties"][field]
+            for field in invalid_fields
+        }
+
+        repair_prompt = self.prompt_manager.generate_repair_prompt(
+            ticket_input=ticket_input,
+            rag_results=rag_results,
+            partial_result=data,
+            missing_fields=invalid_fields,
+            fields_schema_json=json.dumps(fields_schema, indent=2),
+        )
+
+        try:
+            repair_response = self._complete_json(repair_prompt)
         except Exception as e:
-            raise Exception(f"Error en la clasificación LLM: {e}")
+            raise Exception(f"Error en la re-consulta de campos faltantes: {e}")
+
+        missing_data = parse_model_output(repair_response)
+        data.update({k: v for k, v in missing_data.items() if k in invalid_fields})
+        data = repair_classification(data, ticket_input.porcentaje_afectado)
+
+        classification, invalid_fields = validate_classification(data)
+        if classification is None:
+            raise Exception(
+                f"JSON inválido recibido del modelo. Campos inválidos: {', '.join(invalid_fields)}"
+            )
+
+        return classification
@@ -0,0 +1,111 @@
+import json
+import math
+from typing import Any, Dict, List, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from backend.models.output_schema import TicketClassification
+from backend.utils.constants import SLA_MATRIX, PRIORITY_MAPPING
+
+
+# Validador precompilado (se construye una sola vez al importar el módulo)
+CLASSIFICATION_ADAPTER: TypeAdapter = TypeAdapter(TicketClassification)
+
+# Campos que el LLM debe producir (la evidencia RAG se agrega después)
+LLM_FIELDS: List[str] = [
+    name for name in TicketClassification.model_fields if name != "documentos_rag_usados"
+]
+
+# Prioridad → urgencia / SLA, derivados de la matriz ANS
+URGENCY_BY_PRIORITY: Dict[str, str] = {p: u for u, p in PRIORITY_MAPPING.items()}
+SLA_BY_PRIORITY: Dict[str, str] = {
+    p: SLA_MATRIX[u]["solucion"] for u, p in PRIORITY_MAPPING.items()
+}
+
+
+def priority_from_affected(porcentaje_afectado: int) -> str:
+    """Tabla oficial de prioridad por porcentaje de afectación (misma que el prompt)."""
+    if porcentaje_afectado >= 81:
+        return "P1"
+    if porcentaje_afectado >= 51:
+        return "P2"
+    if porcentaje_afectado >= 21:
+        return "P3"
+    return "P4"
+
+
+def parse_model_output(raw_json: str) -> Dict[str, Any]:
+    """Parsea la salida del modelo. Un JSON inválido equivale a un objeto vacío."""
+    try:
+        data = json.loads(raw_json or "")
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _coerce_confidence(value: Any):
+    """
+    Convierte '85%', '85' o 0.85 a un porcentaje dentro de [0, 100].
+    Solo valores estrictamente fraccionarios (0 < v < 1) se leen como fracción:
+    1 significa 1%. Booleanos y valores no finitos se rechazan.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip().rstrip("%").strip()
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    if not math.isfinite(value):
+        return None
+
+    # Confianza expresada como fracción
+    if 0.0 < value < 1.0:
+        value *= 100.0
+
+    return max(0.0, min(100.0, value))
+
+
+def repair_classification(data: Dict[str, Any], porcentaje_afectado: int) -> Dict[str, Any]:
+    """
+    Corrige localmente y de forma determinística los defectos comunes:
+    - Llaves extra (se descartan)
+    - Prioridad ausente o fuera de la tabla (se recalcula con la afectación)
+    - Urgencia y 'sla_objetivo' inconsistentes con la prioridad
+    - 'nivel_confianza' fuera de rango o como texto
+    """
+    repaired = {k: v for k, v in data.items() if k in LLM_FIELDS and v not in (None, "")}
+
+    priority = str(repaired.get("prioridad", "")).strip().upper()
+    if priority not in SLA_BY_PRIORITY:
+        priority = priority_from_affected(porcentaje_afectado)
+    repaired["prioridad"] = priority
+    repaired["urgencia"] = URGENCY_BY_PRIORITY[priority]
+    repaired["sla_objetivo"] = SLA_BY_PRIORITY[priority]
+
+    if "nivel_confianza" in repaired:
+        confidence = _coerce_confidence(repaired["nivel_confianza"])
+        if confidence is None:
+            repaired.pop("nivel_confianza")
+        else:
+            repaired["nivel_confianza"] = confidence
+
+    return repaired
+
+
+def validate_classification(data: Dict[str, Any]) -> Tuple[Any, List[str]]:
+    """
+    Valida con el adaptador precompilado.
+    Retorna (clasificación | None, campos faltantes o inválidos).
+    """
+    try:
+        return CLASSIFICATION_ADAPTER.validate_python(data), []
+    except ValidationError as e:
+        invalid = []
+        for error in e.errors():
+            field = str(error["loc"][0]) if error["loc"] else ""
+            if field in LLM_FIELDS and field not in invalid:
+                invalid.append(field)
+        return None, invalid
@@ -1,9 +1,11 @@
-from typing import List
+import json
+from typing import Any, Dict, List
 
-from backend.utils.constants import SLA_MATRIX, PRIORITY_MAPPING, CLIENT_BUSINESS_IMPACT
+from backend.utils.constants import SLA_MATRIX, PRIORITY_MAPPING
 from backend.models.input_schema import TicketInput
 from backend.models.output_schema import RAGDocument
 from backend.config import settings, DATA_DIR
+from backend.services.client_registry import ClientRegistry
 
 
 class PromptManager:
@@ -15,8 +17,18 @@ class PromptManager:
     - Esquema JSON requerido
     """
 
+    def __init__(self, client_registry: ClientRegistry = None):
+        self.client_registry = client_registry or ClientRegistry(
+            settings.CLIENT_REGISTRY_PATH,
+            reload_interval_seconds=settings.CLIENT_REGISTRY_RELOAD_SECONDS,
+        )
+
+        # La matriz ANS es estática: se formatea una sola vez
+        self._sla_rules = self._generate_sla_rules()
+
     def _format_rag_documents(self, rag_docs: List[RAGDocument]) -> str:
-        if not rag_docs or all(doc.similitud_score < 0.5 for doc in rag_docs):
+        # El umbral de relevancia se aplica en RAGEngine: aquí solo llega evidencia útil
+        if not rag_docs:
             return (
                 "No se encontraron tickets relevantes. "
                 "No inventes evidencia histórica. Clasifica solo con las reglas de negocio."
@@ -33,7 +45,7 @@ class PromptManager:
             )
         return formatted_str
 
-    def _generate_business_rules(self) -> str:
+    def _generate_sla_rules(self) -> str:
         rules = "--- REGLAS DE NEGOCIO Y SLA (Matriz ANS) ---\n"
 
         rules += "\n## REGLAS BÁSICAS DE PRIORIDAD (ANS):\n"
@@ -46,18 +58,20 @@ class PromptManager:
                 f"Asistencia: {sla_data['asistencia']}.\n"
             )
 
+        return rules
+
+    def _generate_business_rules(self, cliente_afectado: str) -> str:
+        rules = self._sla_rules
+
         rules += "\n## BOOSTS DE PRIORIDAD POR CLIENTE:\n"
         rules += "Si un cliente está en riesgo de churn o con impacto crítico, aumenta la prioridad.\n"
 
-        for client, impact in CLIENT_BUSINESS_IMPACT.items():
-            insights = []
-            if impact.get("Estado") == "En Riesgo de Churn":
-                insights.append("Puede subir prioridad si es P3/P4")
-            if impact.get("Impacto_Critico"):
-                insights.append("Impacto crítico: probabilidad de P1 o P2")
-
-            if insights:
-                rules += f"- {client} (${impact['MRR']} MRR): {', '.join(insights)}\n"
+        # Solo la regla del cliente del ticket: el prompt no crece con el número de clientes
+        client_rule = self.client_registry.get_rule(cliente_afectado)
+        if client_rule:
+            rules += client_rule + "\n"
+        else:
+            rules += "- El cliente de este ticket no tiene boosts de prioridad registrados.\n"
 
         return rules
 
@@ -92,7 +106,7 @@ class PromptManager:
         )
 
 
-        system_prompt += self._generate_business_rules() + "\n"
+        system_prompt += self._generate_business_rules(ticket_input.cliente_afectado) + "\n"
 
         system_prompt += (
             "--- TICKET NUEVO ---\n"
@@ -134,3 +148,45 @@ class PromptManager:
         )
 
         return system_prompt
+
+    def generate_repair_prompt(
+        self,
+        ticket_input: TicketInput,
+        rag_results: List[RAGDocument],
+        partial_result: Dict[str, Any],
+        missing_fields: List[str],
+        fields_schema_json: str,
+    ) -> str:
+        """
+        Prompt corto de seguimiento: pide SOLO los campos faltantes,
+        reutilizando la evidencia RAG ya recuperada (sin reglas de clientes ni esquema completo).
+        """
+
+        repair_prompt = (
+            "ERES UN SISTEMA ESTRICTO DE CLASIFICACIÓN DE TICKETS.\n"
+            "UNA CLASIFICACIÓN PREVIA QUEDÓ INCOMPLETA. "
+            "DEVUELVE SOLO UN JSON CON LOS CAMPOS FALTANTES: "
+            f"{', '.join(missing_fields)}.\n\n"
+        )
+
+        repair_prompt += (
+            "--- TICKET ---\n"
+            f"Título: {ticket_input.titulo}\n"
+            f"Descripción: {ticket_input.descripcion}\n"
+            f"Afectación: {ticket_input.porcentaje_afectado}%\n"
+            f"Tipo de Incidente: {ticket_input.tipo_incidente}\n\n"
+        )
+
+        repair_prompt += (
+            "--- CLASIFICACIÓN PARCIAL (NO LA MODIFIQUES) ---\n"
+            f"{json.dumps(partial_result, ensure_ascii=False)}\n\n"
+        )
+
+        repair_prompt += self._format_rag_documents(rag_results) + "\n"
+
+        repair_prompt += (
+            "--- CAMPOS A COMPLETAR (JSON) ---\n"
+            f"{fields_schema_json}\n"
+        )
+
+        return repair_prompt
@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 from typing import List, Dict
 
 import chromadb
@@ -7,42 +8,134 @@ from openai import OpenAI
 
 from backend.config import settings, DATA_DIR
 from backend.models.output_schema import RAGDocument
+from backend.utils.retrieval import (
+    build_document_metadata,
+    build_document_text,
+    distance_to_score,
+    DISTANCE_SPACE,
+)
+
+
+# Motores abiertos por ruta persistente: Chroma comparte un System por ruta, así que
+# solo se detiene cuando se cierra el último motor que lo usa (p. ej. tenants que
+# comparten embeddings_dir con colecciones distintas)
+_SYSTEM_REFS: Dict[str, int] = {}
+_SYSTEM_REFS_LOCK = threading.Lock()
+
+
+class RetrievalError(Exception):
+    """La recuperación falló (embedding o consulta), distinto de 'sin evidencia relevante'."""
 
 
 class RAGEngine:
     """
     Motor RAG funcional usando:
     - OpenAI embeddings
-    - ChromaDB persistente
+    - ChromaDB persistente (espacio coseno)
     """
 
-    def __init__(self):
-        # Inicializar OpenAI Client
+    def __init__(
+        self,
+        collection_name: str = None,
+        knowledge_base_path: str = None,
+        embeddings_dir: str = None,
+        openai_client: OpenAI = None,
+        min_similarity: float = None,
+    ):
+        # Por defecto: colección y Knowledge Base globales (tenant por defecto)
+        self.collection_name = collection_name or settings.CHROMA_COLLECTION_NAME
+        self.knowledge_base_path = knowledge_base_path or settings.KNOWLEDGE_BASE_PATH
+        self.min_similarity = settings.RAG_MIN_SIMILARITY if min_similarity is None else min_similarity
+
+        # Inicializar OpenAI Client (compartido entre tenants si se recibe)
         try:
-            self.openai = OpenAI(api_key=settings.OPENAI_API_KEY)
+            self.openai = openai_client or OpenAI(api_key=settings.OPENAI_API_KEY)
         except Exception as e:
             print("ERROR: No se pudo inicializar OpenAI:", e)
             raise
 
         # Ruta a embeddings
-        chroma_path = os.path.join(DATA_DIR, "embeddings")
+        self.chroma_path = embeddings_dir or os.path.join(DATA_DIR, "embeddings")
 
         # Cliente persistente ChromaDB
-        self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+        self.chroma_client = chromadb.PersistentClient(path=self.chroma_path)
+        with _SYSTEM_REFS_LOCK:
+            _SYSTEM_REFS[self._system_key()] = _SYSTEM_REFS.get(self._system_key(), 0) + 1
+
+        # Colección vectorial con espacio coseno explícito
+        self.collection = self.chroma_client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"hnsw:space": DISTANCE_SPACE},
+        )
+
+        # El espacio no se puede cambiar en una colección existente. Aquí no se migra
+        # (varios procesos arrancan a la vez sobre el mismo directorio): las distancias
+        # de un índice L2 se convierten a coseno y la migración es un paso explícito.
+        self.distance_space = self._collection_space()
+        if self.distance_space != DISTANCE_SPACE:
+            print(
+                f"AVISO: Colección '{self.collection_name}' en espacio {self.distance_space}. "
+                "Migra con: python -m backend.services.index_snapshot migrate"
+            )
+
+    def _collection_space(self) -> str:
+        """Espacio de distancia real de la colección (Chroma usa 'l2' por defecto)."""
+        metadata = self.collection.metadata or {}
+        if "hnsw:space" in metadata:
+            return metadata["hnsw:space"]
+
+        try:
+            configuration = self.collection.configuration_json or {}
+            return (configuration.get("hnsw") or {}).get("space") or "l2"
+        except Exception:
+            return "l2"
+
+    # Reinicio de colección
+    def reset_collection(self, metadata: Dict = None):
+        """Recrea la colección vacía (espacio coseno + metadatos extra, p. ej. checksum de snapshot)."""
+        try:
+            self.chroma_client.delete_collection(name=self.collection_name)
+        except Exception as e:
+            # Otro proceso pudo haberla borrado antes
+            print(f"Colección '{self.collection_name}' no se pudo borrar: {e}")
 
-        # Colección vectorial
         self.collection = self.chroma_client.get_or_create_collection(
-            name=settings.CHROMA_COLLECTION_NAME,
+            name=self.collection_name,
+            metadata={"hnsw:space": DISTANCE_SPACE, **(metadata or {})},
         )
+        self.distance_space = self._collection_space()
+
+    # Migración de espacio (paso explícito, una sola vez)
+    def migrate_distance_space(self) -> bool:
+        """
+        Recrea la colección en espacio coseno reutilizando los vectores ya
+        almacenados (sin llamadas de embeddings). Retorna False si no hacía falta.
+        """
+        if self.distance_space == DISTANCE_SPACE:
+            return False
+
+        data = self.collection.get(include=["documents", "metadatas", "embeddings"])
+        self.reset_collection()
+
+        if len(data["ids"]):
+            self.collection.add(
+                ids=data["ids"],
+                documents=data["documents"],
+                metadatas=data["metadatas"],
+                embeddings=[[float(v) for v in embedding] for embedding in data["embeddings"]],
+            )
+
+        print(f"Colección '{self.collection_name}' migrada a {DISTANCE_SPACE}: {self.collection.count()} documentos.")
+        return True
 
     # Cargar Knowledge Base
     def _load_data(self):
-        if not os.path.exists(settings.KNOWLEDGE_BASE_PATH):
+        if not os.path.exists(self.knowledge_base_path):
             raise FileNotFoundError(
-                f"Knowledge Base no encontrada: {settings.KNOWLEDGE_BASE_PATH}"
+                f"Knowledge Base no encontrada: {self.knowledge_base_path}"
             )
 
-        with open(settings.KNOWLEDGE_BASE_PATH, "r", encoding="utf-8") as f:
+        with open(self.knowledge_base_path, "r", encoding="utf-8") as f:
             return json.load(f)
 
     # Generar Embedding
@@ -74,12 +167,7 @@ class RAGEngine:
         embeddings = []
 
         for item in data:
-            text = (
-                f"Título: {item['titulo']}.\n"
-                f"Descripción: {item['descripcion']}.\n"
-                f"Categoría: {item['categoria']}.\n"
-                f"Solución: {item['solucion']}"
-            )
+            text = build_document_text(item)
 
             vector = self._embed_text(text)
             if vector is None:
@@ -87,11 +175,7 @@ class RAGEngine:
 
             embeddings.append(vector)
             documents.append(text)
-            metadatas.append({
-                "ticket_id": item["ticket_id"],
-                "categoria": item["categoria"],
-                "solucion": f"{item['solucion']} (Tiempo de resolución histórico: {item['tiempo_resolucion']})"
-            })
+            metadatas.append(build_document_metadata(item))
 
             ids.append(str(item["ticket_id"]))
 
@@ -104,15 +188,106 @@ class RAGEngine:
 
         print(f"Indexación completada. Total documentos: {self.collection.count()}")
 
+    # Warmup
+    def warmup(self, k: int = 5):
+        """
+        Carga el índice HNSW en memoria con una consulta real usando un vector
+        ya almacenado (no genera embeddings).
+        """
+        sample = self.collection.get(limit=1, include=["embeddings"])
+        embeddings = sample.get("embeddings")
+        if embeddings is None or not len(embeddings):
+            return
+
+        self.collection.query(
+            query_embeddings=[[float(v) for v in embeddings[0]]],
+            n_results=min(k, self.collection.count()),
+            include=["documents", "metadatas", "distances"],
+        )
+
+    # Liberación del índice
+    def _system_key(self) -> str:
+        return os.path.abspath(self.chroma_path)
+
+    def close(self):
+        """
+        Libera el índice en memoria. Chroma cachea un System por ruta persistente
+        (SharedSystemClient); sin detenerlo, los segmentos HNSW siguen residentes
+        aunque se suelte la referencia al motor. Si otro motor abierto comparte la
+        ruta, el System se mantiene.
+        """
+        if self.chroma_client is None:
+            return
+
+        with _SYSTEM_REFS_LOCK:
+            key = self._system_key()
+            _SYSTEM_REFS[key] = _SYSTEM_REFS.get(key, 1) - 1
+            last_reference = _SYSTEM_REFS[key] <= 0
+            if last_reference:
+                del _SYSTEM_REFS[key]
+
+        if last_reference:
+            try:
+                self._stop_system()
+            except Exception as e:
+                # API interna de Chroma: si cambia, solo se pierde la liberación
+                print(f"AVISO: No se pudo detener el System de Chroma en {self.chroma_path}: {e}")
+
+        self.collection = None
+        self.chroma_client = None
+
+    def _stop_system(self):
+        from chromadb.api.client import SharedSystemClient
+
+        try:
+            identifier = SharedSystemClient._get_identifier_from_settings(self.chroma_client.get_settings())
+        except Exception:
+            identifier = self.chroma_path
+
+        system = SharedSystemClient._identifier_to_system.pop(identifier, None)
+        if system is not None:
+            system.stop()
+
+    # Memoria estimada del índice
+    def estimate_memory_bytes(self) -> int:
+        """
+        Estimación del índice en memoria: vectores float32 + overhead por
+        elemento (enlaces HNSW, ids y metadatos).
+        """
+        count = self.collection.count()
+        if count == 0:
+            return 0
+
+        sample = self.collection.get(limit=1, include=["embeddings"])
+        embeddings = sample.get("embeddings")
+        dims = len(embeddings[0]) if embeddings is not None and len(embeddings) else 0
+
+        return count * (dims * 4 + 512)
+
     # Recuperación
-    def retrieve_documents(self, query_text: str, k: int = 5):
+    def retrieve_documents(
+        self,
+        query_text: str,
+        k: int = 5,
+        min_similarity: float = None,
+        raise_on_error: bool = False,
+    ):
         """
-        Recupera documentos similares.
+        Recupera documentos similares con similitud coseno >= min_similarity.
         Mejora: k aumentado a 5 para mejor recall.
+        Los resultados llegan ordenados por distancia: al primer documento bajo el
+        umbral se corta, y una consulta sin evidencia relevante retorna [].
+        Con raise_on_error, un fallo de embedding o de consulta lanza RetrievalError
+        en lugar de retornar [].
         """
 
+        if min_similarity is None:
+            min_similarity = self.min_similarity
+
         embedding = self._embed_text(query_text)
         if embedding is None:
+            if raise_on_error:
+                raise RetrievalError("No se pudo generar el embedding de la consulta.")
             return []
 
         try:
@@ -123,6 +298,8 @@ class RAGEngine:
             )
         except Exception as e:
             print("Error en consulta:", e)
+            if raise_on_error:
+                raise RetrievalError(f"Error en consulta: {e}")
             return []
 
         docs = []
@@ -133,8 +310,10 @@ class RAGEngine:
             result["distances"][0],
         ):
 
-            # ⚡ similitud basada en distancia invertida
-            score = round(1 / (1 + dist), 4)
+            # ⚡ similitud coseno real (distancia coseno = 1 - similitud)
+            score = distance_to_score(dist, self.distance_space)
+            if score < min_similarity:
+                break
 
             docs.append(
                 RAGDocument(
@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from openai import OpenAI
+
+from backend.config import settings, DATA_DIR
+from backend.services.rag_engine import RAGEngine
+from backend.services.index_snapshot import SnapshotError, import_snapshot, index_lock
+
+
+class UnknownTenantError(KeyError):
+    """El tenant solicitado no está configurado."""
+
+
+def _process_rss_bytes() -> int:
+    """Memoria residente del proceso (Linux: /proc/self/statm). 0 si no está disponible."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+class _TenantStats:
+    """Métricas por tenant (carga, latencia de recuperación y memoria)."""
+
+    def __init__(self):
+        self.loads = 0
+        self.evictions = 0
+        self.last_load_seconds = 0.0
+        self.requests = 0
+        self.total_retrieval_seconds = 0.0
+        self.estimated_memory_bytes = 0
+        self.resident_memory_bytes = 0
+        self.last_used: Optional[float] = None
+
+    @property
+    def memory_bytes(self) -> int:
+        """Memoria medida al cargar (delta de RSS); la estimación solo si no hay medición."""
+        return self.resident_memory_bytes or self.estimated_memory_bytes
+
+    def as_dict(self, loaded: bool) -> Dict[str, Any]:
+        avg_ms = (self.total_retrieval_seconds / self.requests * 1000) if self.requests else 0.0
+        return {
+            "loaded": loaded,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "last_load_ms": round(self.last_load_seconds * 1000, 2),
+            "requests": self.requests,
+            "avg_retrieval_ms": round(avg_ms, 2),
+            "resident_memory_bytes": self.resident_memory_bytes if loaded else 0,
+            "estimated_memory_bytes": self.estimated_memory_bytes if loaded else 0,
+            "last_used": self.last_used,
+        }
+
+
+class TenantManager:
+    """
+    Enrutamiento multi-tenant del motor RAG:
+    - Colección y Knowledge Base propias por tenant (índices aislados)
+    - Carga perezosa: el índice de un tenant se abre en su primera petición
+    - LRU con presupuesto de memoria: los tenants fríos se descargan y su
+      System de Chroma se detiene (la memoria se libera de verdad)
+    """
+
+    def __init__(
+        self,
+        tenants_config_path: str = None,
+        memory_budget_bytes: int = None,
+        max_loaded: int = None,
+    ):
+        self.default_tenant = settings.DEFAULT_TENANT_ID
+        self.memory_budget_bytes = memory_budget_bytes or settings.TENANT_MEMORY_BUDGET_MB * 1024 * 1024
+        self.max_loaded = max_loaded or settings.TENANT_MAX_LOADED
+
+        self.tenants = self._load_config(tenants_config_path or settings.TENANTS_CONFIG_PATH)
+
+        # Cliente OpenAI compartido por todos los motores
+        self.openai = OpenAI(api_key=settings.OPENAI_API_KEY)
+
+        self._engines: "OrderedDict[str, RAGEngine]" = OrderedDict()
+        self._stats: Dict[str, _TenantStats] = {t: _TenantStats() for t in self.tenants}
+        self._lock = threading.Lock()
+        # Un lock de carga por tenant: cargar un tenant frío no bloquea a los demás
+        self._load_locks: Dict[str, threading.Lock] = {t: threading.Lock() for t in self.tenants}
+
+        # Motores en uso por petición; uno descargado en uso se cierra al liberarse
+        self._in_use: Dict[int, int] = {}
+        self._retired: Dict[int, RAGEngine] = {}
+
+    # Configuración
+    def _load_config(self, path: str) -> Dict[str, Dict[str, str]]:
+        """
+        Lee la configuración de tenants. El tenant por defecto siempre existe
+        y usa la colección / Knowledge Base globales.
+        """
+        tenants = {
+            self.default_tenant: {
+                "collection_name": settings.CHROMA_COLLECTION_NAME,
+                "knowledge_base_path": settings.KNOWLEDGE_BASE_PATH,
+                "embeddings_dir": os.path.join(DATA_DIR, "embeddings"),
+                "snapshot_path": settings.INDEX_SNAPSHOT_PATH,
+            }
+        }
+
+        if not path or not os.path.exists(path):
+            return tenants
+
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+
+        for tenant_id, cfg in raw.items():
+            tenants[tenant_id] = {
+                "collection_name": cfg.get("collection_name", f"{tenant_id}_ticket_history"),
+                "knowledge_base_path": self._resolve_path(
+                    cfg.get("knowledge_base_path", os.path.join("knowledge", tenant_id, "Knowledge_base.json"))
+                ),
+                "embeddings_dir": self._resolve_path(
+                    # Raíz hermana de data/embeddings: ningún store queda anidado en otro
+                    cfg.get("embeddings_dir", os.path.join("tenants", tenant_id, "embeddings"))
+                ),
+                "snapshot_path": self._resolve_path(cfg["snapshot_path"]) if cfg.get("snapshot_path") else None,
+            }
+
+        return tenants
+
+    @staticmethod
+    def _resolve_path(path: str) -> str:
+        """Rutas relativas se resuelven contra data/."""
+        return path if os.path.isabs(path) else os.path.join(DATA_DIR, path)
+
+    # Acceso
+    def resolve_tenant(self, tenant_id: Optional[str]) -> str:
+        tenant_id = tenant_id or self.default_tenant
+        if tenant_id not in self.tenants:
+            raise UnknownTenantError(tenant_id)
+        return tenant_id
+
+    def get_engine(self, tenant_id: Optional[str]) -> RAGEngine:
+        """Motor RAG del tenant; lo carga si no está en memoria."""
+        tenant_id = self.resolve_tenant(tenant_id)
+
+        engine = self._get_loaded(tenant_id)
+        if engine is not None:
+            return engine
+
+        with self._load_locks[tenant_id]:
+            # Otro hilo pudo haberlo cargado mientras esperábamos
+            engine = self._get_loaded(tenant_id)
+            if engine is not None:
+                return engine
+
+            engine = self._load_engine(tenant_id)
+
+            with self._lock:
+                self._engines[tenant_id] = engine
+                self._evict_if_needed()
+
+            return engine
+
+    @contextmanager
+    def use_engine(self, tenant_id: Optional[str]) -> Iterator[RAGEngine]:
+        """
+        Motor del tenant reservado durante el bloque: si el LRU lo descarga
+        mientras tanto, su índice se libera recién al salir.
+        """
+        tenant_id = self.resolve_tenant(tenant_id)
+
+        while True:
+            engine = self.get_engine(tenant_id)
+            with self._lock:
+                # Pudo ser descargado entre get_engine y la reserva
+                if self._engines.get(tenant_id) is engine:
+                    self._in_use[id(engine)] = self._in_use.get(id(engine), 0) + 1
+                    break
+
+        try:
+            yield engine
+        finally:
+            with self._lock:
+                self._in_use[id(engine)] -= 1
+                if self._in_use[id(engine)] == 0:
+                    del self._in_use[id(engine)]
+                    retired = self._retired.pop(id(engine), None)
+                    if retired is not None:
+                        retired.close()
+
+    def _get_loaded(self, tenant_id: str) -> Optional[RAGEngine]:
+        with self._lock:
+            engine = self._engines.get(tenant_id)
+            if engine is not None:
+                self._engines.move_to_end(tenant_id)
+                self._stats[tenant_id].last_used = time.time()
+            return engine
+
+    def record_retrieval(self, tenant_id: Optional[str], seconds: float):
+        tenant_id = self.resolve_tenant(tenant_id)
+        with self._lock:
+            stats = self._stats[tenant_id]
+            stats.requests += 1
+            stats.total_retrieval_seconds += seconds
+            stats.last_used = time.time()
+
+    # Carga / descarga
+    def build_engine(self, tenant_id: Optional[str]) -> RAGEngine:
+        """Crea el motor del tenant sin indexar ni registrarlo en el LRU."""
+        cfg = self.tenants[self.resolve_tenant(tenant_id)]
+        return RAGEngine(
+            collection_name=cfg["collection_name"],
+            knowledge_base_path=cfg["knowledge_base_path"],
+            embeddings_dir=cfg["embeddings_dir"],
+            openai_client=self.openai,
+        )
+
+    def _load_engine(self, tenant_id: str) -> RAGEngine:
+        cfg = self.tenants[tenant_id]
+        start = time.perf_counter()
+        rss_before = _process_rss_bytes()
+
+        # Import + indexación bajo lock exclusivo del store: con varios workers solo uno
+        # recrea la colección; los demás abren el handle después y ven el checksum ya importado
+        with index_lock(cfg["embeddings_dir"]):
+            engine = self.build_engine(tenant_id)
+
+            # Snapshot primero: evita re-embeber la Knowledge Base en réplicas nuevas
+            snapshot_path = cfg.get("snapshot_path")
+            if snapshot_path and os.path.exists(snapshot_path):
+                try:
+                    import_snapshot(engine, snapshot_path)
+                except SnapshotError as e:
+                    print(f"ERROR: Snapshot de '{tenant_id}' descartado: {e}")
+                except Exception as e:
+                    # Un snapshot defectuoso nunca debe impedir el arranque: se reindexa
+                    print(f"ERROR: Snapshot de '{tenant_id}' no se pudo importar ({type(e).__name__}): {e}")
+
+            engine.index_data()
+
+        # Chroma abre el HNSW en la primera consulta: se fuerza para medir lo residente
+        engine.warmup(k=settings.RAG_TOP_K)
+
+        stats = self._stats[tenant_id]
+        stats.loads += 1
+        stats.last_load_seconds = time.perf_counter() - start
+        stats.estimated_memory_bytes = engine.estimate_memory_bytes()
+        stats.resident_memory_bytes = max(0, _process_rss_bytes() - rss_before)
+        stats.last_used = time.time()
+
+        print(
+            f"Tenant '{tenant_id}' cargado en {stats.last_load_seconds * 1000:.0f} ms "
+            f"(~{stats.memory_bytes / 1024:.0f} KB)."
+        )
+        return engine
+
+    def _loaded_memory_bytes(self) -> int:
+        return sum(self._stats[t].memory_bytes for t in self._engines)
+
+    def _evict_if_needed(self):
+        """Descarga los tenants menos usados hasta respetar el presupuesto (requiere el lock)."""
+        while len(self._engines) > 1 and (
+            len(self._engines) > self.max_loaded
+            or self._loaded_memory_bytes() > self.memory_budget_bytes
+        ):
+            tenant_id, engine = self._engines.popitem(last=False)
+            self._stats[tenant_id].evictions += 1
+
+            # En uso por otra petición: se cierra cuando esta termine
+            if self._in_use.get(id(engine)):
+                self._retired[id(engine)] = engine
+            else:
+                engine.close()
+
+            print(f"Tenant '{tenant_id}' descargado (LRU).")
+
+    # Reporte
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = set(self._engines)
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "loaded_memory_bytes": self._loaded_memory_bytes(),
+                "process_rss_bytes": _process_rss_bytes(),
+                "tenants": {
+                    tenant_id: stats.as_dict(tenant_id in loaded)
+                    for tenant_id, stats in self._stats.items()
+                },
+            }
@@ -0,0 +1,64 @@
+from typing import Any, Dict
+
+# Plantillas y scoring de recuperación RAG.
+# Compartidos por el motor RAG, el clasificador y el harness de evaluación
+# (backend/evaluation), para que lo que se mide sea exactamente lo que corre en producción.
+
+# Espacio de distancia de las colecciones Chroma
+DISTANCE_SPACE: str = "cosine"
+
+# Similitud coseno mínima para usar un documento como evidencia.
+# Con vectores normalizados equivale al antiguo umbral 0.5 sobre 1/(1+L2²).
+DEFAULT_MIN_SIMILARITY: float = 0.5
+
+# Sufijo de dominio agregado a cada consulta
+DEFAULT_DOMAIN_HINT: str = (
+    "Dominio técnico esperado: verificación de antecedentes, AML, módulo de antecedentes, "
+    "performance, latencia, tiempo de respuesta."
+)
+
+
+def build_search_query(
+    titulo: str,
+    descripcion: str,
+    tipo_incidente: str,
+    porcentaje_afectado: int,
+    domain_hint: str = DEFAULT_DOMAIN_HINT,
+) -> str:
+    """Consulta de búsqueda RAG a partir de los campos del ticket."""
+    query = (
+        f"Título: {titulo}. "
+        f"Descripción: {descripcion}. "
+        f"Tipo de incidente: {tipo_incidente}. "
+        f"Afectación: {porcentaje_afectado}%. "
+    )
+    return query + domain_hint if domain_hint else query.strip()
+
+
+def build_document_text(item: Dict[str, Any]) -> str:
+    """Texto indexado por cada ticket histórico de la Knowledge Base."""
+    return (
+        f"Título: {item['titulo']}.\n"
+        f"Descripción: {item['descripcion']}.\n"
+        f"Categoría: {item['categoria']}.\n"
+        f"Solución: {item['solucion']}"
+    )
+
+
+def build_document_metadata(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadatos indexados por cada ticket histórico (evidencia que llega al prompt)."""
+    return {
+        "ticket_id": item["ticket_id"],
+        "categoria": item["categoria"],
+        "solucion": f"{item['solucion']} (Tiempo de resolución histórico: {item['tiempo_resolucion']})"
+    }
+
+
+def distance_to_score(distance: float, space: str = DISTANCE_SPACE) -> float:
+    """
+    Similitud coseno acotada a [0, 1] a partir de la distancia de Chroma:
+    - cosine / ip: distancia = 1 - cos
+    - l2 (índices sin migrar): distancia = L2² = 2 - 2·cos para vectores normalizados
+    """
+    similarity = 1.0 - distance / 2.0 if space == "l2" else 1.0 - distance
+    return round(max(0.0, min(1.0, similarity)), 4)
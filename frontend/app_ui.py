@@ -1,25 +1,28 @@
+import csv
+import hashlib
+import io
+import os
+import time
 import streamlit as st
 import requests
 import json
-from typing import Dict, Any
-
-# Importar lista de clientes desde el backend (si existe)
-try:
-    from backend.utils.constants import CLIENT_LIST
-except ImportError:
-    CLIENT_LIST = [
-        "TechFin Solutions", 
-        "Retail Express", 
-        "LegalVerify Corp", 
-        "Logística Rápida", 
-        "Recursos Humanos S.A.",
-        "Marketing Cloud E-commerce",
-        "Global",
-        "HealthSecure",
-        "Banco del Mañana",
-        "Telecom Innova",
-        "Otro Cliente"
-    ]
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional
+
+# Lista de respaldo si el backend no expone /clients
+FALLBACK_CLIENT_LIST = [
+    "TechFin Solutions",
+    "Retail Express",
+    "LegalVerify Corp",
+    "Logística Rápida",
+    "Recursos Humanos S.A.",
+    "Marketing Cloud E-commerce",
+    "Global",
+    "HealthSecure",
+    "Banco del Mañana",
+    "Telecom Innova",
+    "Otro Cliente"
+]
 
 # Configuración general de Streamlit
 st.set_page_config(
@@ -28,8 +31,28 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# URL local del backend
-API_URL = "https://ticket-classifier-ia.onrender.com/classify"
+# URL del backend (configurable por variable de entorno)
+API_BASE_URL = os.environ.get("API_BASE_URL", "https://ticket-classifier-ia.onrender.com").rstrip("/")
+API_URL = f"{API_BASE_URL}/classify"
+JOBS_URL = f"{API_BASE_URL}/jobs"
+CLIENTS_URL = f"{API_BASE_URL}/clients"
+
+# Timeouts (conexión, lectura) en segundos
+API_CONNECT_TIMEOUT = float(os.environ.get("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.environ.get("API_READ_TIMEOUT", "120"))
+API_TIMEOUT = (API_CONNECT_TIMEOUT, API_READ_TIMEOUT)
+
+# Tras un fallo de GET /clients se usa la lista de respaldo este tiempo antes de reintentar
+CLIENTS_RETRY_SECONDS = 30
+
+# Memoización de clasificaciones idénticas
+CLASSIFY_CACHE_TTL_SECONDS = int(os.environ.get("CLASSIFY_CACHE_TTL_SECONDS", "600"))
+
+# Carga masiva
+BULK_POLL_INTERVAL_SECONDS = 1.0
+BULK_TIMEOUT_SECONDS = int(os.environ.get("BULK_TIMEOUT_SECONDS", "900"))
+BULK_REQUIRED_FIELDS = ["titulo", "descripcion", "cliente_afectado", "porcentaje_afectado", "tipo_incidente"]
+BULK_OPTIONAL_FIELDS = ["informacion_contextual", "tenant_id"]
 
 # colores por prioridad
 PRIORITY_COLORS = {
@@ -39,21 +62,79 @@ PRIORITY_COLORS = {
     "P4": "#28a745",
 }
 
-# FUNCIÓN: Llamado al backend
-def classify_ticket_api(ticket_data: Dict[str, Any]):
+
+# Recursos compartidos entre reruns
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Sesión HTTP con pool de conexiones, reutilizada entre reruns y usuarios."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_client_list() -> List[str]:
+    """Clientes del registro del backend (GET /clients). Las excepciones no se cachean."""
+    response = get_http_session().get(CLIENTS_URL, timeout=API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def load_client_list() -> List[str]:
+    """
+    Lista de clientes para el selector. Un fallo se recuerda en session_state:
+    con el backend caído cada rerun no vuelve a esperar el timeout de conexión.
+    """
+    if time.time() < st.session_state.get("clients_retry_at", 0):
+        return FALLBACK_CLIENT_LIST
+
     try:
-        response = requests.post(API_URL, json=ticket_data)
+        return _fetch_client_list() or FALLBACK_CLIENT_LIST
+    except (requests.exceptions.RequestException, ValueError):
+        st.session_state["clients_retry_at"] = time.time() + CLIENTS_RETRY_SECONDS
+        return FALLBACK_CLIENT_LIST
 
-        if response.status_code >= 400:
-            try:
-                detail = response.json().get("detail", "Error desconocido.")
-            except:
-                detail = "El backend devolvió una respuesta no JSON."
-            st.error(f"Error HTTP {response.status_code}: {detail}")
-            return None
 
-        return response.json()
+class BackendError(Exception):
+    """Error devuelto por el backend (no se cachea)."""
+
 
+def _error_detail(response: requests.Response) -> str:
+    try:
+        return response.json().get("detail", "Error desconocido.")
+    except ValueError:
+        return "El backend devolvió una respuesta no JSON."
+
+
+@st.cache_data(ttl=CLASSIFY_CACHE_TTL_SECONDS, show_spinner=False)
+def _classify_cached(payload_json: str) -> Dict[str, Any]:
+    """
+    Clasificación memoizada por payload: reenviar el mismo ticket no vuelve a llamar al backend.
+    Las excepciones no se cachean, así que los errores siempre se reintentan.
+    """
+    response = get_http_session().post(API_URL, data=payload_json, timeout=API_TIMEOUT,
+                                       headers={"Content-Type": "application/json"})
+
+    if response.status_code >= 400:
+        raise BackendError(f"Error HTTP {response.status_code}: {_error_detail(response)}")
+
+    return response.json()
+
+
+# FUNCIÓN: Llamado al backend
+def classify_ticket_api(ticket_data: Dict[str, Any]):
+    try:
+        # JSON canónico: payloads idénticos comparten la misma entrada de caché
+        return _classify_cached(json.dumps(ticket_data, sort_keys=True, ensure_ascii=False))
+
+    except BackendError as e:
+        st.error(str(e))
+        return None
+    except requests.exceptions.Timeout:
+        st.error(f"El backend en {API_URL} no respondió a tiempo.")
+        return None
     except requests.exceptions.ConnectionError:
         st.error(f"No se pudo conectar con el backend en {API_URL}. Inicia FastAPI primero.")
         return None
@@ -62,6 +143,191 @@ def classify_ticket_api(ticket_data: Dict[str, Any]):
         return None
 
 
+# FUNCIONES: Carga masiva (API de jobs asíncronos)
+def parse_bulk_file(uploaded_file) -> List[Dict[str, Any]]:
+    """Lee tickets desde CSV o JSONL y los normaliza al esquema de TicketInput."""
+    text = uploaded_file.getvalue().decode("utf-8-sig")
+
+    if uploaded_file.name.lower().endswith(".csv"):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    tickets = []
+    for i, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise ValueError(f"Fila {i}: se esperaba un objeto JSON.")
+
+        missing = [field for field in BULK_REQUIRED_FIELDS if row.get(field) in (None, "")]
+        if missing:
+            raise ValueError(f"Fila {i}: faltan campos {', '.join(missing)}.")
+
+        ticket = {field: row[field] for field in BULK_REQUIRED_FIELDS}
+        ticket["porcentaje_afectado"] = int(float(ticket["porcentaje_afectado"]))
+        for field in BULK_OPTIONAL_FIELDS:
+            ticket[field] = row.get(field) or None
+        tickets.append(ticket)
+
+    return tickets
+
+
+def submit_bulk_job(ticket: Dict[str, Any]) -> Dict[str, Any]:
+    """Encola un ticket; la llave de idempotencia evita duplicados al reenviar el mismo archivo."""
+    payload_json = json.dumps(ticket, sort_keys=True, ensure_ascii=False)
+    idempotency_key = hashlib.sha256(payload_json.encode("utf-8")).hexdigest()
+
+    response = get_http_session().post(
+        JOBS_URL,
+        data=payload_json,
+        timeout=API_TIMEOUT,
+        headers={"Content-Type": "application/json", "Idempotency-Key": idempotency_key},
+    )
+    if response.status_code >= 400:
+        raise BackendError(f"Error HTTP {response.status_code}: {_error_detail(response)}")
+    return response.json()
+
+
+def poll_bulk_job(job_id: str) -> Dict[str, Any]:
+    response = get_http_session().get(f"{JOBS_URL}/{job_id}", timeout=API_TIMEOUT)
+    if response.status_code >= 400:
+        raise BackendError(f"Error HTTP {response.status_code}: {_error_detail(response)}")
+    return response.json()
+
+
+def _bulk_row(index: int, ticket: Dict[str, Any], job: Optional[Dict[str, Any]], error: Optional[str] = None):
+    result = (job or {}).get("result") or {}
+    return {
+        "#": index,
+        "Título": ticket["titulo"],
+        "Cliente": ticket["cliente_afectado"],
+        "Estado": (job or {}).get("status", "error" if error else "pendiente"),
+        "Prioridad": result.get("prioridad"),
+        "Urgencia": result.get("urgencia"),
+        "SLA": result.get("sla_objetivo"),
+        "Categoría": result.get("categoria_sugerida"),
+        "Tiempo Estimado": result.get("tiempo_estimado_resolucion"),
+        "Confianza": result.get("nivel_confianza"),
+        "Error": error or (job or {}).get("error"),
+    }
+
+
+def start_bulk_classification(tickets: List[Dict[str, Any]]):
+    """
+    Registra el lote en session_state. El avance (envíos, job ids, filas) vive ahí,
+    así un rerun por interacción retoma el lote en vez de descartarlo.
+    """
+    st.session_state["bulk"] = {
+        "tickets": tickets,
+        "rows": [_bulk_row(i + 1, ticket, None) for i, ticket in enumerate(tickets)],
+        "next_submit": 0,
+        "pending": {},
+        "deadline": time.time() + BULK_TIMEOUT_SECONDS,
+    }
+
+
+def resume_bulk_classification(bulk: Dict[str, Any]):
+    """Continúa encolando y sondeando desde el estado guardado; actualiza la tabla en cada paso."""
+    tickets, rows, pending = bulk["tickets"], bulk["rows"], bulk["pending"]
+
+    progress = st.progress(0.0, text="Encolando tickets...")
+    table = st.empty()
+    table.dataframe(rows, use_container_width=True)
+
+    while bulk["next_submit"] < len(tickets):
+        i = bulk["next_submit"]
+        try:
+            job = submit_bulk_job(tickets[i])
+            rows[i] = _bulk_row(i + 1, tickets[i], job)
+            if job["status"] in ("pending", "running"):
+                pending[i] = job["job_id"]
+        except Exception as e:
+            rows[i] = _bulk_row(i + 1, tickets[i], None, error=str(e))
+        bulk["next_submit"] = i + 1
+
+    table.dataframe(rows, use_container_width=True)
+
+    while pending and time.time() < bulk["deadline"]:
+        for i, job_id in list(pending.items()):
+            try:
+                job = poll_bulk_job(job_id)
+            except Exception as e:
+                rows[i] = _bulk_row(i + 1, tickets[i], None, error=str(e))
+                pending.pop(i)
+                continue
+
+            rows[i] = _bulk_row(i + 1, tickets[i], job)
+            if job["status"] not in ("pending", "running"):
+                pending.pop(i)
+
+        done = len(tickets) - len(pending)
+        progress.progress(done / len(tickets), text=f"Clasificados {done}/{len(tickets)}")
+        table.dataframe(rows, use_container_width=True)
+
+        if pending:
+            time.sleep(BULK_POLL_INTERVAL_SECONDS)
+
+    if pending:
+        st.warning(f"{len(pending)} tickets siguen en proceso tras {BULK_TIMEOUT_SECONDS}s.")
+    else:
+        progress.progress(1.0, text=f"Clasificados {len(tickets)}/{len(tickets)}")
+
+
+def _rows_to_csv(rows: List[Dict[str, Any]]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def display_bulk_mode():
+    st.subheader("📦 Carga Masiva de Tickets")
+    st.caption(
+        "Sube un CSV o JSONL con las columnas: "
+        + ", ".join(BULK_REQUIRED_FIELDS)
+        + " (opcionales: " + ", ".join(BULK_OPTIONAL_FIELDS) + ")."
+    )
+
+    uploaded_file = st.file_uploader("Archivo de tickets", type=["csv", "jsonl"])
+
+    if uploaded_file is not None and st.button("🚀 Clasificar Lote"):
+        try:
+            tickets = parse_bulk_file(uploaded_file)
+        except (ValueError, KeyError, TypeError) as e:
+            st.error(f"Archivo inválido: {e}")
+            return
+
+        if not tickets:
+            st.warning("El archivo no contiene tickets.")
+            return
+
+        start_bulk_classification(tickets)
+
+    bulk = st.session_state.get("bulk")
+    if not bulk:
+        return
+
+    resume_bulk_classification(bulk)
+
+    rows = bulk["rows"]
+    if rows:
+        c1, c2 = st.columns(2)
+        c1.download_button(
+            "⬇️ Exportar CSV",
+            data=_rows_to_csv(rows),
+            file_name="clasificaciones.csv",
+            mime="text/csv",
+            use_container_width=True,
+        )
+        c2.download_button(
+            "⬇️ Exportar JSONL",
+            data="\n".join(json.dumps(row, ensure_ascii=False) for row in rows),
+            file_name="clasificaciones.jsonl",
+            mime="application/json",
+            use_container_width=True,
+        )
+
+
 # FUNCIÓN: Mostrar los resultados
 def display_classification_result(result: Dict[str, Any]):
     st.subheader("Resultados de la Clasificación")
@@ -156,7 +422,7 @@ def main():
         with st.form(key="ticket_form"):
             titulo = st.text_input("Título del Incidente")
             descripcion = st.text_area("Descripción Detallada", height=150)
-            cliente = st.selectbox("Cliente Afectado", CLIENT_LIST)
+            cliente = st.selectbox("Cliente Afectado", load_client_list())
 
             c1, c2 = st.columns(2)
             with c1:
@@ -207,11 +473,17 @@ def main():
                     st.session_state["feedback_status"] = "Pendiente"
                     st.rerun()
 
+    tab_single, tab_bulk = st.tabs(["Ticket Individual", "Carga Masiva"])
+
     # Mostrar resultado
-    if st.session_state["classification_result"]:
-        display_classification_result(st.session_state["classification_result"])
-    else:
-        st.info("Radica un ticket desde la barra lateral para comenzar.")
+    with tab_single:
+        if st.session_state["classification_result"]:
+            display_classification_result(st.session_state["classification_result"])
+        else:
+            st.info("Radica un ticket desde la barra lateral para comenzar.")
+
+    with tab_bulk:
+        display_bulk_mode()
 
 
 if __name__ == "__main__":